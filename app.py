@@ -1,21 +1,157 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, request, jsonify, send_file, send_from_directory, Response, stream_with_context, g
 from flask_sqlalchemy import SQLAlchemy
-from ultralytics import YOLO
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
 from PIL import Image
 import io
 import base64
+import functools
 import os
-import uuid
-from datetime import datetime
-from blink_model import BlinkDetector
+import hashlib
+import multiprocessing
+import time
+import click
+import psutil
+from collections import defaultdict
+from datetime import datetime, timedelta
+from assets import AssetServer
+from blink_sessions import BlinkSessionManager, SessionLimitReached
+import ear_series
+import typing_features
+from bulk_ingest import ARCHIVE_ERRORS, ArchiveTooLarge, CappedReader, iter_archive_images
+from inference import BatchingPredictor
+from inference_backends import load_backend
+from inference_pool import InferencePool
+from jobs import JobQueue
+from loaders import BackgroundLoader, ResourceNotReady
+from metrics import QueryTimer, Registry
+from migrations import full_table_scans, run_migrations
+from persistence import WriteCoalescer, WriteTimeout, configure_database, install_sqlite_pragmas
+from prediction_cache import PredictionCache, file_fingerprint
+from response_cache import PatientResponseCache
+from sampling_profiler import SamplingProfiler
+from upload_store import UploadStore
+from werkzeug.exceptions import RequestEntityTooLarge
 from werkzeug.security import generate_password_hash, check_password_hash
 
-app = Flask(__name__, static_folder='.', static_url_path='')
+# INSTANCE_PATH (absolute) moves instance/ (caches, metrics, stamps) out of the source tree
+app = Flask(__name__, static_folder='.', static_url_path='', instance_path=os.environ.get('INSTANCE_PATH'))
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
+configure_database(app)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Micro-batching for /predict: larger batches / longer waits trade p50 latency for throughput
+app.config['PREDICT_BATCH_SIZE'] = int(os.environ.get('PREDICT_BATCH_SIZE', 8))
+app.config['PREDICT_BATCH_WAIT_MS'] = float(os.environ.get('PREDICT_BATCH_WAIT_MS', 10))
+# Model loading: 'background' (default), 'lazy' (on first use) or 'eager' (at import)
+app.config['MODEL_LOADING'] = os.environ.get('MODEL_LOADING', 'background')
+# Inference backend: 'eager', 'torchscript' or 'torchscript-int8'
+app.config['INFERENCE_BACKEND'] = os.environ.get('INFERENCE_BACKEND', 'eager')
+# Out-of-process inference: 0 workers keeps the model in the web process
+app.config['INFERENCE_WORKERS'] = int(os.environ.get('INFERENCE_WORKERS', 0))
+app.config['INFERENCE_TORCH_THREADS'] = int(os.environ.get('INFERENCE_TORCH_THREADS', 1))
+app.config['INFERENCE_CPU_AFFINITY'] = os.environ.get('INFERENCE_CPU_AFFINITY', '')
+app.config['MAX_UPLOAD_BYTES'] = int(os.environ.get('MAX_UPLOAD_BYTES', 50 * 1024 * 1024))
+app.config['BULK_MAX_BYTES'] = int(os.environ.get('BULK_MAX_BYTES', 2 * 1024 ** 3))
+# Werkzeug answers 413 before reading a larger body; sized for a base64 JSON scan (4/3 of the image),
+# /predict_bulk and /analyze_blink_video raise it to their own limits
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get(
+    'MAX_CONTENT_LENGTH', app.config['MAX_UPLOAD_BYTES'] * 4 // 3 + 1024 * 1024))
+app.config['BULK_MAX_FILES'] = int(os.environ.get('BULK_MAX_FILES', 5000))
+app.config['BULK_BATCH_SIZE'] = int(os.environ.get('BULK_BATCH_SIZE', 32))
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 4))
+app.config['JOB_RETENTION_SECONDS'] = float(os.environ.get('JOB_RETENTION_SECONDS', 3600))
+app.config['PREDICTION_CACHE_SIZE'] = int(os.environ.get('PREDICTION_CACHE_SIZE', 1024))
+app.config['PREDICTION_CACHE_TTL'] = float(os.environ.get('PREDICTION_CACHE_TTL', 7 * 24 * 3600))
+# Output of `python assets.py`; static requests fall back to the source tree when it is absent
+app.config['STATIC_BUILD_DIR'] = os.environ.get('STATIC_BUILD_DIR', 'dist')
+app.config['PATIENT_CACHE_SIZE'] = int(os.environ.get('PATIENT_CACHE_SIZE', 2048))
+# Concurrent blink tests: one FaceMesh per session, sessions older than the timeout are reaped
+app.config['BLINK_MAX_SESSIONS'] = int(os.environ.get('BLINK_MAX_SESSIONS', 32))
+app.config['BLINK_SESSION_TIMEOUT'] = float(os.environ.get('BLINK_SESSION_TIMEOUT', 120))
+# 'client': the browser streams frames to /blink_frame; 'camera': the server opens its own webcam
+app.config['BLINK_FRAME_SOURCE'] = os.environ.get('BLINK_FRAME_SOURCE', 'client')
+app.config['BLINK_MAX_FRAME_BYTES'] = int(os.environ.get('BLINK_MAX_FRAME_BYTES', 512 * 1024))
+# Live preview pushed by /blink_preview (MJPEG): JPEG quality and frame-rate cap per session
+app.config['BLINK_PREVIEW_QUALITY'] = int(os.environ.get('BLINK_PREVIEW_QUALITY', 70))
+app.config['BLINK_PREVIEW_FPS'] = float(os.environ.get('BLINK_PREVIEW_FPS', 10))
+# FaceMesh input: downscale frames wider than BLINK_PROCESS_WIDTH (0 = off), crop around the last seen eyes
+app.config['BLINK_PROCESS_WIDTH'] = int(os.environ.get('BLINK_PROCESS_WIDTH', 0))
+app.config['BLINK_CROP_ROI'] = os.environ.get('BLINK_CROP_ROI', '0') == '1'
+app.config['BLINK_OVERLAYS'] = os.environ.get('BLINK_OVERLAYS', '1') == '1'
+app.config['BLINK_VIDEO_MAX_BYTES'] = int(os.environ.get('BLINK_VIDEO_MAX_BYTES', 1024 ** 3))
+app.config['BLINK_VIDEO_WORKERS'] = int(os.environ.get('BLINK_VIDEO_WORKERS', 2))
+# Scan storage: content-addressed originals plus JPEG thumbnails of THUMBNAIL_SIZE px
+app.config['THUMBNAIL_SIZE'] = int(os.environ.get('THUMBNAIL_SIZE', 256))
+app.config['THUMBNAIL_MAX_BYTES'] = int(os.environ.get('THUMBNAIL_MAX_BYTES', 256 * 1024 ** 2))
+# `flask prune-uploads`: originals of scans older than UPLOAD_RETENTION_DAYS (0 = never) are removed,
+# thumbnails kept; unreferenced files go once older than UPLOAD_ORPHAN_GRACE_SECONDS
+app.config['UPLOAD_RETENTION_DAYS'] = float(os.environ.get('UPLOAD_RETENTION_DAYS', 0))
+app.config['UPLOAD_ORPHAN_GRACE_SECONDS'] = float(os.environ.get('UPLOAD_ORPHAN_GRACE_SECONDS', 3600))
+# Set by gunicorn.conf.py to its worker count; 0 when running as a single process
+app.config['SERVE_WORKERS'] = int(os.environ.get('SERVE_WORKERS', 0))
+# /debug/profile samples every thread's stack; off unless explicitly enabled
+app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED', '0') == '1'
 db = SQLAlchemy(app)
 
+# Metrics, exported by /metrics in the Prometheus text format
+metrics = Registry()
+request_seconds = metrics.histogram(
+    'http_request_duration_seconds', 'Request latency by route', ('method', 'route', 'status'))
+request_queries = metrics.histogram(
+    'http_request_db_queries', 'SQL statements run per request', ('route',),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 500))
+request_db_seconds = metrics.histogram(
+    'http_request_db_seconds', 'Time spent in SQL per request', ('route',))
+db_query_seconds = metrics.histogram('db_query_duration_seconds', 'SQL statement latency by verb', ('verb',))
+scan_stage_seconds = metrics.histogram('scan_stage_duration_seconds', 'Time per stage of a scan upload', ('stage',))
+inference_batch_size = metrics.histogram(
+    'inference_batch_size', 'Images per model batch', buckets=(1, 2, 4, 8, 16, 32, 64))
+blink_stage_seconds = metrics.histogram(
+    'blink_frame_stage_duration_seconds', 'Time per stage of a blink detection frame', ('stage',))
+
+with app.app_context():
+    install_sqlite_pragmas(app, db.engine)
+    query_timer = QueryTimer(db.engine, db_query_seconds)
+
+write_coalescer = None
+if app.config['WRITE_COALESCING']:
+    write_coalescer = WriteCoalescer(
+        app, db,
+        max_batch=app.config['WRITE_BATCH_SIZE'],
+        max_latency_ms=app.config['WRITE_FLUSH_MS']
+    )
+
+
+# prefork workers share the invalidation generations, so a write in one worker is seen by all;
+# CLI commands that rewrite results reach the server's caches through the stamp file
+patient_cache = PatientResponseCache(
+    max_entries=app.config['PATIENT_CACHE_SIZE'],
+    generations=multiprocessing.Array('q', 4096) if app.config['SERVE_WORKERS'] else None,
+    stamp_path=os.path.join(app.instance_path, 'patient_cache.stamp')
+)
+
+
+def _write(fn, patient_id=None):
+    """Run fn(session) -> row in a committed transaction and return the row's id.
+
+    With WRITE_COALESCING on, the transaction is shared with other concurrent
+    writes by the background writer. patient_id's cached history is dropped
+    once the write has committed. A write that times out or fails to commit
+    raises, and database_unavailable/database_error answer for the route.
+    """
+    if write_coalescer is not None:
+        row_id = write_coalescer.write(fn)
+    else:
+        row = fn(db.session)
+        db.session.flush()
+        row_id = row.id
+        db.session.commit()
+    if patient_id is not None:
+        patient_cache.invalidate(int(patient_id))
+    return row_id
+
+
 # Database models
 class Patient(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -26,7 +162,7 @@ class Patient(db.Model):
     password = db.Column(db.String(255), nullable=True)
     phone = db.Column(db.String(50))
     address = db.Column(db.String(500))
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
     scans = db.relationship('Scan', backref='patient', lazy=True)
     blink_results = db.relationship('BlinkResult', backref='patient', lazy=True)
@@ -51,6 +187,15 @@ class BlinkResult(db.Model):
     duration = db.Column(db.Float)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    series = db.relationship('BlinkSeries', uselist=False, lazy=True)
+
+
+class BlinkSeries(db.Model):
+    """Per-frame EAR series of a blink test, in ear_series' compressed encoding."""
+    blink_result_id = db.Column(db.Integer, db.ForeignKey('blink_result.id'), primary_key=True)
+    sample_count = db.Column(db.Integer)
+    data = db.Column(db.LargeBinary, nullable=False)
+
 
 class TypingResult(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -65,6 +210,17 @@ class TypingResult(db.Model):
     avg_key_delay = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    keystrokes = db.relationship('TypingKeystrokes', uselist=False, lazy=True)
+
+
+class TypingKeystrokes(db.Model):
+    """Raw keystroke timing stream of a typing test, in typing_features' compressed encoding."""
+    typing_result_id = db.Column(db.Integer, db.ForeignKey('typing_result.id'), primary_key=True)
+    event_count = db.Column(db.Integer)
+    typed_text = db.Column(db.Text)
+    formula_version = db.Column(db.Integer)
+    data = db.Column(db.LargeBinary, nullable=False)
+
 
 class Admin(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -73,20 +229,307 @@ class Admin(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
 
+class PatientSummary(db.Model):
+    """Per-patient rollup for the admin dashboard, maintained on every result write."""
+    patient_id = db.Column(db.Integer, db.ForeignKey('patient.id'), primary_key=True)
+    latest_scan_class = db.Column(db.String(100))
+    latest_scan_confidence = db.Column(db.Float)
+    latest_scan_at = db.Column(db.DateTime)
+    latest_blink_count = db.Column(db.Integer)
+    latest_blink_at = db.Column(db.DateTime)
+    latest_typing_risk = db.Column(db.Integer)
+    latest_typing_at = db.Column(db.DateTime)
+    scan_count = db.Column(db.Integer, nullable=False, default=0)
+    blink_test_count = db.Column(db.Integer, nullable=False, default=0)
+    typing_test_count = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# Indexes for login lookups and per-patient history; existing databases get them from migrations.py
+db.Index('ix_patient_email_lower', db.func.lower(Patient.email))
+db.Index('ix_admin_email_lower', db.func.lower(Admin.email))
+db.Index('ix_patient_created_id', Patient.created_at, Patient.id)
+db.Index('ix_scan_patient_created', Scan.patient_id, Scan.created_at)
+db.Index('ix_blink_result_patient_created', BlinkResult.patient_id, BlinkResult.created_at)
+db.Index('ix_typing_result_patient_created', TypingResult.patient_id, TypingResult.created_at)
+
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Create missing tables and apply pending schema migrations."""
+    applied = run_migrations(db, upload_store, rebuild_patient_summaries)
+    print(f"Applied migrations: {applied}" if applied else "Schema is up to date")
+
+
+def _hot_path_queries():
+    """Representative statements for endpoints that must not fall back to full table scans."""
+    email = 'probe@example.com'
+    patient_id = 1
+    page = db.select(Patient).order_by(Patient.created_at.desc(), Patient.id.desc()).limit(MAX_PATIENT_PAGE_SIZE + 1)
+    return {
+        'admin_login': db.select(Admin).where(db.func.lower(Admin.email) == email),
+        'login_patient': db.select(Patient).where(
+            db.func.lower(Patient.email) == email,
+            Patient.password.isnot(None),
+            Patient.password != ''
+        ).order_by(Patient.id.desc()).limit(1),
+        'register_patient': db.select(Patient).where(db.func.lower(Patient.email) == email).limit(1),
+        'patients_first_page': page,
+        'patients_next_page': page.where(_after_cursor((datetime(2024, 1, 1), patient_id))),
+        'patient_scans': db.select(Scan).where(Scan.patient_id == patient_id),
+        'patient_blink_results': db.select(BlinkResult).where(BlinkResult.patient_id == patient_id),
+        'patient_typing_results': db.select(TypingResult).where(TypingResult.patient_id == patient_id),
+        'delete_scans': db.delete(Scan).where(Scan.patient_id == patient_id),
+        'delete_blink_results': db.delete(BlinkResult).where(BlinkResult.patient_id == patient_id),
+        'delete_typing_results': db.delete(TypingResult).where(TypingResult.patient_id == patient_id)
+    }
+
+
+def check_query_plans():
+    """Map of hot-path query name -> full table scans in its SQLite plan (empty when all are indexed)."""
+    failures = {}
+    with db.engine.connect() as conn:
+        for name, statement in _hot_path_queries().items():
+            scans = full_table_scans(conn, statement)
+            if scans:
+                failures[name] = scans
+    return failures
+
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if a login or history query falls back to a full table scan."""
+    failures = check_query_plans()
+    for name, scans in failures.items():
+        print(f"{name}: {'; '.join(scans)}")
+    if failures:
+        raise SystemExit(1)
+    print("All hot-path queries use indexes")
+
+
 # Model loading
-try:
-    model = YOLO('best.pt')
-    print("Model loaded successfully")
-except Exception as e:
-    print(f"Error loading model: {e}")
-    model = None
+MODEL_PATH = 'best.pt'
+MODEL_CACHE_DIR = os.path.join(app.instance_path, 'models')
+# part of every prediction cache key, so it must be known before the model finishes loading
+model_version = f"{file_fingerprint(MODEL_PATH)}:{app.config['INFERENCE_BACKEND']}" \
+    if os.path.exists(MODEL_PATH) else None
+inference_pool = None
+
+if app.config['INFERENCE_WORKERS'] > 0:
+    inference_pool = InferencePool(
+        MODEL_PATH,
+        backend=app.config['INFERENCE_BACKEND'],
+        cache_dir=MODEL_CACHE_DIR,
+        workers=app.config['INFERENCE_WORKERS'],
+        torch_threads=app.config['INFERENCE_TORCH_THREADS'],
+        cpu_affinity=app.config['INFERENCE_CPU_AFFINITY']
+    )
+    inference_pool.start()
+
+
+def _load_scan_model():
+    if inference_pool is not None:
+        return inference_pool.wait_ready()
+    # under gunicorn the master only loads the weights; each forked worker warms up its own copy
+    return load_backend(app.config['INFERENCE_BACKEND'], MODEL_PATH, cache_dir=MODEL_CACHE_DIR,
+                        warmup=not app.config['SERVE_WORKERS'])
+
+
+def _load_blink_sessions():
+    from blink_model import BlinkDetector, create_face_mesh
+
+    def warm_face_mesh():
+        face_mesh = create_face_mesh()
+        BlinkDetector(face_mesh=face_mesh).warmup()
+        return face_mesh
+
+    detector_factory = functools.partial(
+        BlinkDetector,
+        preview_quality=app.config['BLINK_PREVIEW_QUALITY'],
+        preview_fps=app.config['BLINK_PREVIEW_FPS'],
+        overlays=app.config['BLINK_OVERLAYS'],
+        process_width=app.config['BLINK_PROCESS_WIDTH'],
+        crop_roi=app.config['BLINK_CROP_ROI'],
+        stage_timer=blink_stage_seconds
+    )
+    sessions = BlinkSessionManager(
+        detector_factory, warm_face_mesh,
+        pool_size=app.config['BLINK_MAX_SESSIONS'],
+        session_timeout=app.config['BLINK_SESSION_TIMEOUT']
+    )
+    sessions.pool.prewarm(1)
+    return sessions
+
+
+scan_model = BackgroundLoader('scan model', _load_scan_model, app.config['MODEL_LOADING']).start()
+# FaceMesh graphs run their own threads and cannot be inherited across fork(); gunicorn workers build them
+blink_loader = BackgroundLoader(
+    'blink detector', _load_blink_sessions, 'lazy' if app.config['SERVE_WORKERS'] else app.config['MODEL_LOADING']
+).start()
 
-blink_detector = BlinkDetector()
+
+
+def _predict_batch(images):
+    inference_batch_size.observe(len(images))
+    with scan_stage_seconds.time('model_predict'):
+        return scan_model.get().predict_batch(images)
+
+
+predictor = BatchingPredictor(
+    _predict_batch,
+    max_batch_size=app.config['PREDICT_BATCH_SIZE'],
+    max_wait_ms=app.config['PREDICT_BATCH_WAIT_MS'],
+    concurrency=app.config['INFERENCE_WORKERS'] or 1
+)
+
+
+def _scan_model_unavailable():
+    """Error response while the scan model cannot serve requests, else None."""
+    if scan_model.state == 'failed':
+        return jsonify({'error': 'Model not loaded'}), 500
+    if not scan_model.ready and scan_model.mode != 'lazy':
+        return jsonify({'error': 'Model is still loading'}), 503, {'Retry-After': '5'}
+    return None
 
 UPLOAD_FOLDER = "uploads"
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+UPLOAD_CHUNK_SIZE = 64 * 1024
+upload_store = UploadStore(UPLOAD_FOLDER, thumbnail_size=app.config['THUMBNAIL_SIZE'])
+
+os.makedirs(app.instance_path, exist_ok=True)
+prediction_cache = PredictionCache(
+    os.path.join(app.instance_path, 'prediction_cache.db'),
+    max_entries=app.config['PREDICTION_CACHE_SIZE'],
+    ttl_seconds=app.config['PREDICTION_CACHE_TTL']
+)
+
+scan_jobs = JobQueue(
+    workers=app.config['JOB_WORKERS'],
+    retention_seconds=app.config['JOB_RETENTION_SECONDS']
+)
+
+video_jobs = JobQueue(
+    workers=app.config['BLINK_VIDEO_WORKERS'],
+    retention_seconds=app.config['JOB_RETENTION_SECONDS']
+)
+
+# Readiness probe
+@app.route('/ready', methods=['GET'])
+def ready():
+    """200 once every model is loaded and warmed up, 503 until then."""
+    components = {
+        'scan_model': scan_model.status(),
+        'blink_detector': blink_loader.status()
+    }
+    if inference_pool is not None:
+        components['scan_model']['workers_ready'] = inference_pool.ready_workers
+    is_ready = all(c['state'] == 'ready' for c in components.values())
+    return jsonify({'ready': is_ready, 'components': components}), 200 if is_ready else 503
+
+
+# Metrics endpoint and request instrumentation
+process = psutil.Process()
+profiler = SamplingProfiler()
+
+
+def _blink_stat(name):
+    # under lazy loading get() would load the detector on the scrape thread
+    return lambda: blink_loader.get(timeout=0).stats()[name] if blink_loader.ready else None
+
+
+metrics.gauge('predict_queue_depth', 'Images waiting for a model batch', predictor.queue_depth)
+metrics.gauge('write_queue_depth', 'Writes waiting for the write coalescer',
+              lambda: write_coalescer.queue_depth() if write_coalescer is not None else None)
+metrics.gauge('job_queue_depth', 'Background jobs waiting for a worker', lambda: {
+    ('scan',): scan_jobs.stats()['queued'], ('blink_video',): video_jobs.stats()['queued']}, ('queue',))
+metrics.gauge('jobs_running', 'Background jobs running', lambda: {
+    ('scan',): scan_jobs.stats()['running'], ('blink_video',): video_jobs.stats()['running']}, ('queue',))
+metrics.gauge('inference_workers_alive', 'Live out-of-process inference workers',
+              lambda: inference_pool.alive_workers() if inference_pool is not None else None)
+metrics.gauge('blink_active_sessions', 'Blink tests in progress', _blink_stat('active_sessions'))
+metrics.gauge('blink_frames_per_second', 'Mean frame rate of the blink tests in progress', _blink_stat('mean_fps'))
+metrics.gauge('blink_sessions_rejected', 'Blink tests turned away because every slot was busy',
+              _blink_stat('rejected'))
+metrics.gauge('upload_deduplicated', 'Scan uploads that matched an already stored file',
+              lambda: upload_store.deduplicated)
+metrics.gauge('process_resident_memory_bytes', 'Resident set size', lambda: process.memory_info().rss)
+metrics.gauge('process_virtual_memory_bytes', 'Virtual memory size', lambda: process.memory_info().vms)
+metrics.gauge('process_cpu_seconds', 'User and system CPU time', lambda: sum(process.cpu_times()[:2]))
+metrics.gauge('process_threads', 'OS threads', lambda: process.num_threads())
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    query_timer.reset()
+
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        # streamed responses (MJPEG, SSE) are timed up to their first byte
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_seconds.observe(time.perf_counter() - started, request.method, route, response.status_code)
+        queries, seconds = query_timer.take()
+        request_queries.observe(queries, route)
+        request_db_seconds.observe(seconds, route)
+    return response
+
+
+@app.errorhandler(WriteTimeout)
+@app.errorhandler(OperationalError)
+def database_unavailable(e):
+    # the write coalescer did not commit in time, or SQLite stayed locked past busy_timeout
+    db.session.rollback()
+    return jsonify({'error': 'Database is busy, try again'}), 503
+
+
+@app.errorhandler(SQLAlchemyError)
+def database_error(e):
+    db.session.rollback()
+    app.logger.exception('Database error')
+    return jsonify({'error': 'Could not save to the database'}), 500
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    limit = request.max_content_length
+    return jsonify({'error': f'Request body exceeds {limit} bytes'}), 413
+
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/debug/profile', methods=['GET'])
+def debug_profile():
+    """Sample every thread for ?seconds= (default 10, at most 60) and return folded stacks for a flamegraph."""
+    if not app.config['PROFILING_ENABLED']:
+        return jsonify({'error': 'Profiling is disabled; set PROFILING_ENABLED=1'}), 404
+    try:
+        seconds = min(float(request.args.get('seconds', 10)), 60.0)
+        interval_ms = max(float(request.args.get('interval_ms', 5)), 1.0)
+    except ValueError:
+        return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+    folded = profiler.profile(seconds, interval_ms / 1000)
+    if folded is None:
+        return jsonify({'error': 'A profile is already running'}), 409
+    return Response(folded, mimetype='text/plain')
+
 
 # Static file serving
+asset_server = AssetServer(os.path.join(app.root_path, app.config['STATIC_BUILD_DIR']))
+
+
+@app.before_request
+def serve_built_asset():
+    """Serve pages and assets from the fingerprinted, precompressed build when there is one."""
+    if asset_server.active and request.method in ('GET', 'HEAD') \
+            and request.endpoint in ('index', 'serve_file', 'static'):
+        return asset_server.response(request.path, request)
+
+
 @app.route('/')
 def index():
     return send_from_directory('.', 'index.html')
@@ -236,41 +679,109 @@ def register_patient():
     return jsonify({'patient_id': patient.id, 'name': patient.name})
 
 
-# Admin - get all patients
-@app.route('/get_patients', methods=['GET'])
-def get_patients():
-    """Return all patients with their test results."""
-    patients = Patient.query.order_by(Patient.created_at.desc()).all()
-    result = []
-    for p in patients:
-        scans = [{
-            'id': s.id,
-            'scan_type': s.scan_type,
-            'scan_date': s.scan_date,
-            'predicted_class': s.predicted_class,
-            'confidence': round(s.confidence * 100, 1) if s.confidence else None,
-            'created_at': s.created_at.strftime('%Y-%m-%d %H:%M') if s.created_at else ''
-        } for s in p.scans]
-
-        blinks = [{
-            'id': b.id,
-            'blink_count': b.blink_count,
-            'duration': b.duration,
-            'created_at': b.created_at.strftime('%Y-%m-%d %H:%M') if b.created_at else ''
-        } for b in p.blink_results]
-
-        typings = [{
-            'id': t.id,
-            'wpm': t.wpm,
-            'accuracy': t.accuracy,
-            'risk_score': t.risk_score,
-            'backspace_count': t.backspace_count,
-            'pause_count': t.pause_count,
-            'hesitation_count': t.hesitation_count,
-            'avg_key_delay': t.avg_key_delay,
-            'created_at': t.created_at.strftime('%Y-%m-%d %H:%M') if t.created_at else ''
-        } for t in p.typing_results]
+# Patient summaries
+SUMMARY_COUNTERS = ('scan_count', 'blink_test_count', 'typing_test_count')
+
+
+def _update_summary(patient_id, counter, increment=1, **latest):
+    """Upsert a patient's summary row in the current transaction.
+
+    counter is bumped by increment and the latest_* columns are overwritten.
+    """
+    now = datetime.utcnow()
+    insert_fn = {'sqlite': sqlite_insert, 'postgresql': pg_insert}.get(db.engine.dialect.name)
+    if insert_fn is None:
+        summary = db.session.get(PatientSummary, patient_id)
+        if summary is None:
+            summary = PatientSummary(patient_id=patient_id, **{c: 0 for c in SUMMARY_COUNTERS})
+            db.session.add(summary)
+        setattr(summary, counter, getattr(summary, counter) + increment)
+        for key, value in latest.items():
+            setattr(summary, key, value)
+        summary.updated_at = now
+        return
+
+    stmt = insert_fn(PatientSummary).values(patient_id=patient_id, updated_at=now, **{counter: increment}, **latest)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PatientSummary.patient_id],
+        set_={counter: getattr(PatientSummary, counter) + increment, 'updated_at': now, **latest}
+    )
+    db.session.execute(stmt)
+
+
+def _latest_per_patient(model_cls, session):
+    """Each patient's most recent row of a result table."""
+    rank = db.func.row_number().over(
+        partition_by=model_cls.patient_id,
+        order_by=(model_cls.created_at.desc(), model_cls.id.desc())
+    ).label('rank')
+    ranked = session.query(model_cls.id, rank).subquery()
+    return session.query(model_cls).join(ranked, ranked.c.id == model_cls.id).filter(ranked.c.rank == 1)
+
+
+def rebuild_patient_summaries(session=None):
+    """Regenerate the patient_summary table from the raw result tables (in db.session unless given one)."""
+    session = db.session if session is None else session
+    rows = {pid: {'patient_id': pid, 'scan_count': 0, 'blink_test_count': 0, 'typing_test_count': 0}
+            for (pid,) in session.query(Patient.id)}
+
+    for model_cls, counter in ((Scan, 'scan_count'), (BlinkResult, 'blink_test_count'),
+                               (TypingResult, 'typing_test_count')):
+        counts = session.query(model_cls.patient_id, db.func.count(model_cls.id)).group_by(model_cls.patient_id)
+        for pid, count in counts:
+            if pid in rows:
+                rows[pid][counter] = count
+
+    for s in _latest_per_patient(Scan, session):
+        if s.patient_id in rows:
+            rows[s.patient_id].update(latest_scan_class=s.predicted_class,
+                                      latest_scan_confidence=s.confidence, latest_scan_at=s.created_at)
+    for b in _latest_per_patient(BlinkResult, session):
+        if b.patient_id in rows:
+            rows[b.patient_id].update(latest_blink_count=b.blink_count, latest_blink_at=b.created_at)
+    for t in _latest_per_patient(TypingResult, session):
+        if t.patient_id in rows:
+            rows[t.patient_id].update(latest_typing_risk=t.risk_score, latest_typing_at=t.created_at)
+
+    now = datetime.utcnow()
+    session.query(PatientSummary).delete(synchronize_session=False)
+    if rows:
+        session.execute(db.insert(PatientSummary), [{**r, 'updated_at': now} for r in rows.values()])
+    session.commit()
+    return len(rows)
+
+
+@app.cli.command('rebuild-summaries')
+def rebuild_summaries_command():
+    """Rebuild the per-patient summary table from scans, blink and typing results."""
+    count = rebuild_patient_summaries()
+    print(f"Rebuilt summaries for {count} patients")
+
+
+@app.route('/get_patient_summaries', methods=['GET'])
+def get_patient_summaries():
+    """Dashboard rows: each patient with their latest results and test counts.
+
+    Supports the same limit/cursor paging as /get_patients.
+    """
+    try:
+        cursor = _decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    limit = max(1, min(request.args.get('limit', MAX_PATIENT_PAGE_SIZE, type=int), MAX_PATIENT_PAGE_SIZE))
+
+    query = db.session.query(Patient, PatientSummary).outerjoin(
+        PatientSummary, PatientSummary.patient_id == Patient.id
+    )
+    rows = _patients_after(cursor, limit + 1, query=query)
 
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers['X-Next-Cursor'] = _encode_cursor(rows[-1][0])
+
+    result = []
+    for p, summary in rows:
         result.append({
             'id': p.id,
             'name': p.name,
@@ -278,37 +789,50 @@ def get_patients():
             'gender': p.gender,
             'email': p.email,
             'phone': p.phone,
-            'address': p.address,
-            'registered_at': p.created_at.strftime('%Y-%m-%d %H:%M') if p.created_at else '',
-            'scans': scans,
-            'blink_results': blinks,
-            'typing_results': typings
+            'registered_at': p.created_at.strftime(LIST_DATE_FORMAT) if p.created_at else '',
+            'latest_scan_class': summary.latest_scan_class if summary else None,
+            'latest_scan_confidence': round(summary.latest_scan_confidence * 100, 1)
+            if summary and summary.latest_scan_confidence else None,
+            'latest_blink_count': summary.latest_blink_count if summary else None,
+            'latest_typing_risk': summary.latest_typing_risk if summary else None,
+            'scan_count': summary.scan_count if summary else 0,
+            'blink_test_count': summary.blink_test_count if summary else 0,
+            'typing_test_count': summary.typing_test_count if summary else 0
         })
+    return jsonify(result), 200, headers
 
-    return jsonify(result)
 
+# Admin - get all patients
+LIST_DATE_FORMAT = '%Y-%m-%d %H:%M'
+DETAIL_DATE_FORMAT = '%d %b %Y, %H:%M'
+PATIENT_PAGE_SIZE = 200
+MAX_PATIENT_PAGE_SIZE = 1000
 
-@app.route('/get_patient/<int:patient_id>', methods=['GET'])
-def get_patient(patient_id):
-    """Return details for a single patient including all test history."""
-    p = Patient.query.get_or_404(patient_id)
-    scans = [{
+
+def _scan_dict(s, date_fmt):
+    digest = upload_store.digest_of(s.file_path)
+    return {
         'id': s.id,
+        'thumbnail_url': f'/thumbnails/{digest}.jpg' if digest else None,
         'scan_type': s.scan_type,
         'scan_date': s.scan_date,
         'predicted_class': s.predicted_class,
         'confidence': round(s.confidence * 100, 1) if s.confidence else None,
-        'created_at': s.created_at.strftime('%d %b %Y, %H:%M') if s.created_at else ''
-    } for s in p.scans]
+        'created_at': s.created_at.strftime(date_fmt) if s.created_at else ''
+    }
+
 
-    blinks = [{
+def _blink_dict(b, date_fmt):
+    return {
         'id': b.id,
         'blink_count': b.blink_count,
         'duration': b.duration,
-        'created_at': b.created_at.strftime('%d %b %Y, %H:%M') if b.created_at else ''
-    } for b in p.blink_results]
+        'created_at': b.created_at.strftime(date_fmt) if b.created_at else ''
+    }
 
-    typings = [{
+
+def _typing_dict(t, date_fmt):
+    return {
         'id': t.id,
         'wpm': t.wpm,
         'accuracy': t.accuracy,
@@ -317,10 +841,12 @@ def get_patient(patient_id):
         'pause_count': t.pause_count,
         'hesitation_count': t.hesitation_count,
         'avg_key_delay': t.avg_key_delay,
-        'created_at': t.created_at.strftime('%d %b %Y, %H:%M') if t.created_at else ''
-    } for t in p.typing_results]
+        'created_at': t.created_at.strftime(date_fmt) if t.created_at else ''
+    }
 
-    return jsonify({
+
+def _patient_dict(p, scans, blinks, typings, date_fmt):
+    return {
         'id': p.id,
         'name': p.name,
         'age': p.age,
@@ -328,11 +854,143 @@ def get_patient(patient_id):
         'email': p.email,
         'phone': p.phone,
         'address': p.address,
-        'registered_at': p.created_at.strftime('%d %b %Y, %H:%M') if p.created_at else '',
-        'scans': scans,
-        'blink_results': blinks,
-        'typing_results': typings
-    })
+        'registered_at': p.created_at.strftime(date_fmt) if p.created_at else '',
+        'scans': [_scan_dict(s, date_fmt) for s in scans],
+        'blink_results': [_blink_dict(b, date_fmt) for b in blinks],
+        'typing_results': [_typing_dict(t, date_fmt) for t in typings]
+    }
+
+
+def _children_by_patient(model_cls, patient_ids, per_patient=None):
+    """Load a child table for many patients in one query, grouped by patient_id.
+
+    per_patient limits each patient to their latest N rows.
+    """
+    if per_patient == 0:
+        return defaultdict(list)
+    query = model_cls.query.filter(model_cls.patient_id.in_(patient_ids))
+    if per_patient:
+        rank = db.func.row_number().over(
+            partition_by=model_cls.patient_id,
+            order_by=(model_cls.created_at.desc(), model_cls.id.desc())
+        ).label('rank')
+        ranked = db.session.query(model_cls.id, rank).filter(model_cls.patient_id.in_(patient_ids)).subquery()
+        query = model_cls.query.join(ranked, ranked.c.id == model_cls.id).filter(ranked.c.rank <= per_patient)
+    grouped = defaultdict(list)
+    for row in query.order_by(model_cls.id):
+        grouped[row.patient_id].append(row)
+    return grouped
+
+
+def _encode_cursor(p):
+    raw = f"{p.created_at.isoformat()}|{p.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    created_at, patient_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+    return datetime.fromisoformat(created_at), int(patient_id)
+
+
+def _after_cursor(cursor):
+    # a row-value comparison lets the database seek ix_patient_created_id to the cursor
+    return db.tuple_(Patient.created_at, Patient.id) < db.tuple_(*cursor)
+
+
+def _patients_after(cursor, count, query=None):
+    """Next page of patients in (created_at desc, id desc) order, starting after cursor."""
+    query = Patient.query if query is None else query
+    if cursor:
+        query = query.filter(_after_cursor(cursor))
+    return query.order_by(Patient.created_at.desc(), Patient.id.desc()).limit(count).all()
+
+
+def _parse_history(value):
+    """'full' -> None (everything), 'latest' -> 1, or an integer N >= 0."""
+    if value in (None, '', 'full'):
+        return None
+    if value == 'latest':
+        return 1
+    return max(0, int(value))
+
+
+@app.route('/get_patients', methods=['GET'])
+def get_patients():
+    """Return patients with their test results as a streamed JSON array.
+
+    Optional query parameters:
+      limit    page size; the cursor for the next page is sent in X-Next-Cursor
+      cursor   value of X-Next-Cursor from the previous page
+      history  'full' (default), 'latest' or N latest results per test type
+    """
+    try:
+        limit = request.args.get('limit', type=int)
+        cursor = _decode_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        per_patient = _parse_history(request.args.get('history'))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor or history parameter'}), 400
+
+    headers = {}
+    first_page = None
+    if limit:
+        limit = max(1, min(limit, MAX_PATIENT_PAGE_SIZE))
+        first_page = _patients_after(cursor, limit + 1)
+        if len(first_page) > limit:
+            first_page = first_page[:limit]
+            headers['X-Next-Cursor'] = _encode_cursor(first_page[-1])
+
+    def pages():
+        if first_page is not None:
+            for i in range(0, len(first_page), PATIENT_PAGE_SIZE):
+                yield first_page[i:i + PATIENT_PAGE_SIZE]
+            return
+        after = cursor
+        while True:
+            page = _patients_after(after, PATIENT_PAGE_SIZE)
+            if not page:
+                return
+            yield page
+            if len(page) < PATIENT_PAGE_SIZE:
+                return
+            after = (page[-1].created_at, page[-1].id)
+
+    def generate():
+        yield '['
+        first = True
+        for page in pages():
+            ids = [p.id for p in page]
+            scans = _children_by_patient(Scan, ids, per_patient)
+            blinks = _children_by_patient(BlinkResult, ids, per_patient)
+            typings = _children_by_patient(TypingResult, ids, per_patient)
+            for p in page:
+                item = _patient_dict(p, scans[p.id], blinks[p.id], typings[p.id], LIST_DATE_FORMAT)
+                yield ('' if first else ',') + app.json.dumps(item)
+                first = False
+            db.session.expunge_all()
+        yield ']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json', headers=headers)
+
+
+@app.route('/get_patient/<int:patient_id>', methods=['GET'])
+def get_patient(patient_id):
+    """Return details for a single patient including all test history.
+
+    Responses carry a strong ETag and are cached until one of the patient's
+    results changes, so If-None-Match revalidation costs no database query.
+    """
+    cached = patient_cache.get(patient_id)
+    if cached is None:
+        generation = patient_cache.generation(patient_id)
+        p = Patient.query.get_or_404(patient_id)
+        body = app.json.dumps(_patient_dict(p, p.scans, p.blink_results, p.typing_results, DETAIL_DATE_FORMAT))
+        cached = patient_cache.put(patient_id, generation, body.encode())
+    etag, body = cached
+
+    response = app.response_class(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
 
 
 @app.route('/delete_patient/<int:patient_id>', methods=['DELETE'])
@@ -340,81 +998,513 @@ def delete_patient(patient_id):
     """Delete a patient and all their associated test results."""
     p = Patient.query.get_or_404(patient_id)
     try:
+        BlinkSeries.query.filter(BlinkSeries.blink_result_id.in_(
+            db.select(BlinkResult.id).where(BlinkResult.patient_id == patient_id)
+        )).delete(synchronize_session=False)
         BlinkResult.query.filter_by(patient_id=patient_id).delete(synchronize_session=False)
+        TypingKeystrokes.query.filter(TypingKeystrokes.typing_result_id.in_(
+            db.select(TypingResult.id).where(TypingResult.patient_id == patient_id)
+        )).delete(synchronize_session=False)
         TypingResult.query.filter_by(patient_id=patient_id).delete(synchronize_session=False)
         Scan.query.filter_by(patient_id=patient_id).delete(synchronize_session=False)
+        PatientSummary.query.filter_by(patient_id=patient_id).delete(synchronize_session=False)
         db.session.delete(p)
         db.session.commit()
+        patient_cache.invalidate(patient_id)
         return jsonify({'status': 'deleted', 'id': patient_id})
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 # MRI prediction
-@app.route('/predict', methods=['POST'])
-def predict():
-    if not model:
-        return jsonify({'error': 'Model not loaded'}), 500
+class UploadTooLarge(Exception):
+    pass
 
-    data = request.json
-    if not data or 'image' not in data:
-        return jsonify({'error': 'No image data provided'}), 400
 
+def _stream_to_file(stream, file_path, limit):
+    """Copy an upload stream to disk in chunks, enforcing a size limit.
+
+    Returns the sha256 hex digest of the written bytes.
+    """
+    size = 0
+    h = hashlib.sha256()
     try:
-        patient_id = data.get('patient_id')
-        scan_type = data.get('scan_type', 'MRI')
-        scan_date = data.get('scan_date', datetime.utcnow().strftime('%Y-%m-%d'))
-        image_base64 = data.get('image')
+        with open(file_path, 'wb') as f:
+            while True:
+                chunk = stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > limit:
+                    raise UploadTooLarge(f'Upload exceeds {limit} bytes')
+                h.update(chunk)
+                f.write(chunk)
+    except Exception:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return h.hexdigest()
+
 
+class ScanUpload:
+    """A received scan, identified by the sha256 of its bytes.
+
+    The bytes are either held in memory (JSON uploads) or staged in a
+    .part file in the upload store's staging directory (streamed uploads)
+    until persist() moves them into the store or discard() drops them.
+    """
+
+    def __init__(self, digest, data=None, staged_path=None):
+        self.digest = digest
+        self.data = data
+        self.staged_path = staged_path
+
+    def image(self):
+        img = Image.open(io.BytesIO(self.data) if self.data is not None else self.staged_path)
+        img.load()
+        return img
+
+    def persist(self):
+        if self.data is not None:
+            return upload_store.put_bytes(self.digest, self.data)
+        file_path = upload_store.put_file(self.digest, self.staged_path)
+        self.staged_path = None
+        return file_path
+
+    def discard(self):
+        if self.staged_path and os.path.exists(self.staged_path):
+            os.remove(self.staged_path)
+        self.staged_path = None
+
+
+def _scan_upload_source():
+    """Return where the scan image comes from: 'json', 'multipart', 'raw' or None."""
+    if request.is_json:
+        data = request.get_json(silent=True)
+        return 'json' if isinstance(data, dict) and isinstance(data.get('image'), str) and data['image'] else None
+    if 'image' in request.files:
+        return 'multipart'
+    if request.mimetype.startswith('image/') or request.mimetype == 'application/octet-stream':
+        return 'raw'
+    return None
+
+
+def _scan_fields(source):
+    """Form fields sent alongside the scan (JSON body, multipart form or query string)."""
+    if source == 'json':
+        return request.json
+    if source == 'multipart':
+        return request.form
+    return request.args
+
+
+def _receive_scan_upload(source):
+    """Read the uploaded scan from the request into a ScanUpload."""
+    limit = app.config['MAX_UPLOAD_BYTES']
+
+    if source == 'json':
+        with scan_stage_seconds.time('base64_decode'):
+            image_bytes = base64.b64decode(request.json['image'].split(',')[1])
+        if len(image_bytes) > limit:
+            raise UploadTooLarge(f'Upload exceeds {limit} bytes')
+        return ScanUpload(hashlib.sha256(image_bytes).hexdigest(), data=image_bytes)
+
+    stream = request.files['image'].stream if source == 'multipart' else request.stream
+    with scan_stage_seconds.time('stream_to_disk'):
+        return _stage_stream(stream, limit)
+
+
+def _stage_stream(stream, limit):
+    """Stream an image to a staging .part file and wrap it in a ScanUpload."""
+    staged_path = upload_store.staging_path()
+    digest = _stream_to_file(stream, staged_path, limit)
+    return ScanUpload(digest, staged_path=staged_path)
+
+
+def _start_classification(upload):
+    """Look the scan up in the prediction cache and queue it for inference on a miss."""
+    cache_key = PredictionCache.make_key(upload.digest, model_version)
+    with scan_stage_seconds.time('cache_lookup'):
+        cached = prediction_cache.get(cache_key)
+    if cached is not None:
+        return cache_key, cached, None
+    with scan_stage_seconds.time('image_decode'):
+        image = upload.image()
+    return cache_key, cached, predictor.submit(image)
+
+
+def _finish_classification(upload, started):
+    """Wait for a classification started by _start_classification and store the scan.
+
+    Returns (predicted_class, confidence, file_path).
+    """
+    cache_key, cached, pending = started
+    if cached is None:
+        with scan_stage_seconds.time('inference'):
+            predicted_class, confidence = pending.result()
+    else:
+        predicted_class, confidence = cached['class'], cached['confidence']
+
+    if cached is not None and os.path.exists(cached['file_path']):
+        upload.discard()
+        return predicted_class, confidence, cached['file_path']
+
+    with scan_stage_seconds.time('persist'):
+        file_path = upload.persist()
+    with scan_stage_seconds.time('cache_store'):
+        prediction_cache.put(cache_key, predicted_class, confidence, file_path)
+    return predicted_class, confidence, file_path
+
+
+def _classify_upload(upload):
+    """Classify and store a scan, reusing cached results for repeat uploads."""
+    return _finish_classification(upload, _start_classification(upload))
+
+
+def _scan_job_fields(data):
+    """Copy the scan form fields out of the request so they outlive it."""
+    return {
+        'patient_id': data.get('patient_id'),
+        'scan_type': data.get('scan_type', 'MRI'),
+        'scan_date': data.get('scan_date', datetime.utcnow().strftime('%Y-%m-%d')),
+        'name': data.get('name', 'Anonymous'),
+        'email': data.get('email', ''),
+        'phone': data.get('phone', '')
+    }
+
+
+def _process_scan(fields, upload):
+    """Classify a received scan and record it against the patient."""
+    try:
+        patient_id = fields['patient_id']
         if not patient_id:
-            name = data.get('name', 'Anonymous')
-            email = data.get('email', '')
-            phone = data.get('phone', '')
-            patient = Patient(name=name, email=email, phone=phone)
+            patient = Patient(name=fields['name'], email=fields['email'], phone=fields['phone'])
             db.session.add(patient)
-            db.session.commit()
+            with scan_stage_seconds.time('db_commit'):
+                db.session.commit()
             patient_id = patient.id
 
-        image_data = image_base64.split(',')[1]
-        image_bytes = base64.b64decode(image_data)
+        predicted_class, confidence, file_path = _classify_upload(upload)
+
+        patient_id = int(patient_id)
+
+        def add_scan(session):
+            scan = Scan(
+                patient_id=patient_id,
+                file_path=file_path,
+                scan_type=fields['scan_type'],
+                scan_date=fields['scan_date'],
+                predicted_class=predicted_class,
+                confidence=confidence
+            )
+            session.add(scan)
+            _update_summary(patient_id, 'scan_count', latest_scan_class=predicted_class,
+                            latest_scan_confidence=confidence, latest_scan_at=datetime.utcnow())
+            return scan
+
+        with scan_stage_seconds.time('db_commit'):
+            scan_id = _write(add_scan, patient_id)
+        return {
+            'class': predicted_class,
+            'confidence': confidence,
+            'patient_id': patient_id,
+            'scan_id': scan_id
+        }
+    finally:
+        upload.discard()
+
+
+def _process_scan_job(fields, upload):
+    with app.app_context():
+        return _process_scan(fields, upload)
 
-        filename = f"{uuid.uuid4()}.png"
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
 
-        with open(file_path, "wb") as f:
-            f.write(image_bytes)
+def _check_scan_request():
+    """Validate a scan upload request; returns (source, error_response)."""
+    unavailable = _scan_model_unavailable()
+    if unavailable:
+        return None, unavailable
 
-        img = Image.open(io.BytesIO(image_bytes))
-        results = model.predict(source=img, verbose=False)
-        probs = results[0].probs
-        predicted_class = results[0].names[probs.top1]
-        confidence = float(probs.top1conf)
+    source = _scan_upload_source()
+    if not source:
+        return None, (jsonify({'error': 'No image data provided'}), 400)
 
-        scan = Scan(
-            patient_id=patient_id,
-            file_path=file_path,
-            scan_type=scan_type,
-            scan_date=scan_date,
-            predicted_class=predicted_class,
-            confidence=confidence
-        )
-        db.session.add(scan)
-        db.session.commit()
+    limit = app.config['MAX_UPLOAD_BYTES']
+    if source != 'json' and request.content_length and request.content_length > limit + UPLOAD_CHUNK_SIZE:
+        return None, (jsonify({'error': f'Upload exceeds {limit} bytes'}), 413)
+    return source, None
 
-        return jsonify({'class': predicted_class, 'confidence': confidence})
 
+@app.route('/predict', methods=['POST'])
+def predict():
+    """Classify an MRI scan.
+
+    The image can be sent as a multipart 'image' file, as a raw image body
+    (fields in the query string) or as a base64 data URL in JSON.
+    """
+    source, error = _check_scan_request()
+    if error:
+        return error
+
+    try:
+        fields = _scan_job_fields(_scan_fields(source))
+        result = _process_scan(fields, _receive_scan_upload(source))
+        return jsonify({'class': result['class'], 'confidence': result['confidence']})
+
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except (WriteTimeout, OperationalError) as e:
+        return database_unavailable(e)
+    except SQLAlchemyError as e:
+        return database_error(e)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
+@app.route('/predict_async', methods=['POST'])
+def predict_async():
+    """Queue an MRI scan for classification and return a job id immediately.
+
+    Accepts the same request formats as /predict. Poll /jobs/<job_id>
+    (optionally with ?wait=<seconds> to long-poll) for the result.
+    """
+    source, error = _check_scan_request()
+    if error:
+        return error
+
+    try:
+        fields = _scan_job_fields(_scan_fields(source))
+        upload = _receive_scan_upload(source)
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+    job_id = scan_jobs.submit(_process_scan_job, fields, upload)
+    return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': f'/jobs/{job_id}'}), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Status of an async scan or video job; ?wait=<seconds> blocks until it finishes (max 30)."""
+    wait = min(request.args.get('wait', 0, type=float), 30.0)
+    for jobs in (scan_jobs, video_jobs):
+        if jobs.get(job_id) is not None:
+            return jsonify(jobs.wait(job_id, wait) if wait > 0 else jobs.get(job_id))
+    return jsonify({'error': 'Job not found'}), 404
+
+
+@app.route('/jobs_stats', methods=['GET'])
+def jobs_stats():
+    """Queue depth and timing for async scan jobs."""
+    stats = scan_jobs.stats()
+    stats['inference_queue'] = predictor.queue_depth()
+    return jsonify(stats)
+
+
+def _bulk_images():
+    """Yield (name, fileobj) for every image in a /predict_bulk request."""
+    if 'archive' in request.files:
+        f = request.files['archive']
+        yield from iter_archive_images(f.stream, f.filename, f.mimetype, upload_store.tmp_dir)
+    elif 'images' in request.files:
+        for f in request.files.getlist('images'):
+            yield f.filename, f.stream
+    else:
+        stream = CappedReader(request.stream, app.config['BULK_MAX_BYTES'])
+        yield from iter_archive_images(stream, '', request.mimetype, upload_store.tmp_dir)
+
+
+@app.route('/predict_bulk', methods=['POST'])
+def predict_bulk():
+    """Classify many scans for one patient and record them in a single transaction.
+
+    Accepts a multipart 'archive' (zip or tar), a multipart list of 'images',
+    or a raw zip/tar request body with the fields in the query string.
+    Returns a per-file manifest.
+    """
+    unavailable = _scan_model_unavailable()
+    if unavailable:
+        return unavailable
+
+    request.max_content_length = app.config['BULK_MAX_BYTES']
+    fields = request.form if request.files else request.args
+    patient_id = fields.get('patient_id', type=int)
+    if not patient_id:
+        return jsonify({'error': 'patient_id required'}), 400
+    if db.session.get(Patient, patient_id) is None:
+        return jsonify({'error': 'Patient not found'}), 404
+
+    max_bytes = app.config['BULK_MAX_BYTES']
+    if request.content_length and request.content_length > max_bytes:
+        return jsonify({'error': f'Upload exceeds {max_bytes} bytes'}), 413
+
+    scan_type = fields.get('scan_type', 'MRI')
+    scan_date = fields.get('scan_date', datetime.utcnow().strftime('%Y-%m-%d'))
+    manifest = []
+    scans = []
+
+    def classify(batch):
+        started = []
+        for entry, upload in batch:
+            try:
+                started.append((entry, upload, _start_classification(upload)))
+            except Exception as e:
+                upload.discard()
+                entry.update(status='error', error=str(e))
+        for entry, upload, job in started:
+            try:
+                predicted_class, confidence, file_path = _finish_classification(upload, job)
+            except Exception as e:
+                entry.update(status='error', error=str(e))
+                continue
+            finally:
+                upload.discard()
+            scan = Scan(
+                patient_id=patient_id,
+                file_path=file_path,
+                scan_type=scan_type,
+                scan_date=scan_date,
+                predicted_class=predicted_class,
+                confidence=confidence
+            )
+            db.session.add(scan)
+            scans.append((entry, scan))
+            entry.update(status='ok', **{'class': predicted_class, 'confidence': confidence})
+
+    batch = []
+    try:
+        for name, fileobj in _bulk_images():
+            if len(manifest) >= app.config['BULK_MAX_FILES']:
+                raise ArchiveTooLarge(f"More than {app.config['BULK_MAX_FILES']} images in one request")
+            entry = {'file': name}
+            manifest.append(entry)
+            try:
+                batch.append((entry, _stage_stream(fileobj, app.config['MAX_UPLOAD_BYTES'])))
+            except UploadTooLarge as e:
+                entry.update(status='error', error=str(e))
+            if len(batch) >= app.config['BULK_BATCH_SIZE']:
+                classify(batch)
+                batch = []
+        classify(batch)
+        batch = []
+
+        db.session.flush()
+        for entry, scan in scans:
+            entry['scan_id'] = scan.id
+        if scans:
+            last = scans[-1][1]
+            _update_summary(patient_id, 'scan_count', increment=len(scans), latest_scan_class=last.predicted_class,
+                            latest_scan_confidence=last.confidence, latest_scan_at=datetime.utcnow())
+        db.session.commit()
+        patient_cache.invalidate(patient_id)
+    except ArchiveTooLarge as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 413
+    except ARCHIVE_ERRORS:
+        db.session.rollback()
+        return jsonify({'error': 'Upload is not a readable zip or tar archive'}), 400
+    except Exception:
+        db.session.rollback()
+        app.logger.exception('Bulk scan upload failed')
+        return jsonify({'error': 'Bulk upload failed'}), 500
+    finally:
+        for _, upload in batch:
+            upload.discard()
+
+    return jsonify({
+        'patient_id': patient_id,
+        'total': len(manifest),
+        'succeeded': len(scans),
+        'failed': len(manifest) - len(scans),
+        'files': manifest
+    })
+
+
+@app.route('/prediction_cache_stats', methods=['GET'])
+def prediction_cache_stats():
+    """Hit/miss counters for the scan prediction cache."""
+    return jsonify(prediction_cache.stats())
+
+# Scan storage
+@app.route('/thumbnails/<digest>.jpg', methods=['GET'])
+def scan_thumbnail(digest):
+    """JPEG thumbnail of a stored scan, created on first request; the URL is content-addressed."""
+    if upload_store.digest_of(digest) is None:
+        return "File not found", 404
+    try:
+        thumb = upload_store.thumbnail(digest)
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError):
+        # the original is stored but PIL cannot decode it (e.g. a .bin upload)
+        return "Not an image", 415
+    if thumb is None:
+        return "File not found", 404
+    # the mtime doubles as last-served time for trim_thumbnails()
+    os.utime(thumb)
+    return send_file(thumb, mimetype='image/jpeg', max_age=365 * 24 * 3600)
+
+
+def prune_uploads(dry_run=False):
+    """Apply the upload retention policy; returns counts of removed files and bytes."""
+    retention = app.config['UPLOAD_RETENTION_DAYS']
+    cutoff = datetime.utcnow() - timedelta(days=retention) if retention else None
+    keep, known = set(), set()
+    query = db.select(Scan.file_path, db.func.max(Scan.created_at)) \
+        .where(Scan.file_path.isnot(None)).group_by(Scan.file_path)
+    for file_path, latest in db.session.execute(query.execution_options(yield_per=5000)):
+        known.add(file_path)
+        if cutoff is None or latest is None or latest >= cutoff:
+            keep.add(file_path)
+
+    result = upload_store.evict(keep, known, app.config['UPLOAD_ORPHAN_GRACE_SECONDS'], dry_run=dry_run)
+    trimmed = upload_store.trim_thumbnails(app.config['THUMBNAIL_MAX_BYTES'], dry_run=dry_run)
+    result['thumbnails'] += trimmed['thumbnails']
+    result['bytes'] += trimmed['bytes']
+    return result
+
+
+@app.cli.command('prune-uploads')
+@click.option('--dry-run', is_flag=True, help='only report what would be removed')
+def prune_uploads_command(dry_run):
+    """Remove expired and unreferenced uploads, trim the thumbnail cache and drop expired cached predictions."""
+    result = prune_uploads(dry_run=dry_run)
+    predictions = prediction_cache.prune(dry_run=dry_run)
+    print(f"{'Would remove' if dry_run else 'Removed'} {result['originals']} originals, {result['legacy']} legacy files, "
+          f"{result['thumbnails']} thumbnails, {result['staging']} staging files ({result['bytes']} bytes) "
+          f"and {predictions} expired cached predictions")
+
+
+@app.cli.command('upload-usage')
+def upload_usage_command():
+    """Report the size of the upload store."""
+    for name, value in upload_store.usage().items():
+        print(f"{name}: {value}")
+
+
 # Blink detection
+def _blink_session_id():
+    data = request.get_json(silent=True) or {}
+    return request.args.get('session_id') or data.get('session_id')
+
+
 @app.route('/start_blink_detection', methods=['POST'])
 def start_blink_detection():
+    """Start a blink test in a new session; the returned session_id is passed to the other endpoints."""
     try:
-        success = blink_detector.start()
-        if success:
-            return jsonify({'status': 'started'})
-        else:
-            return jsonify({'status': 'error', 'error': 'Failed to start camera'}), 500
+        sessions = blink_loader.get(timeout=0)
+        session_id, blink_detector = sessions.create()
+        camera = app.config['BLINK_FRAME_SOURCE'] == 'camera'
+        if blink_detector.start(camera=camera):
+            return jsonify({
+                'status': 'started',
+                'session_id': session_id,
+                'frame_source': 'camera' if camera else 'client',
+                'frame_interval_ms': round(blink_detector.suggested_interval() * 1000)
+            })
+        sessions.close(session_id)
+        return jsonify({'status': 'error', 'error': 'Failed to start camera'}), 500
+    except (ResourceNotReady, SessionLimitReached) as e:
+        return jsonify({'status': 'error', 'error': str(e)}), 503, {'Retry-After': '5'}
     except Exception as e:
         return jsonify({'status': 'error', 'error': str(e)}), 500
 
@@ -422,6 +1512,7 @@ def start_blink_detection():
 @app.route('/get_blink_stats', methods=['GET'])
 def get_blink_stats():
     try:
+        blink_detector = blink_loader.get(timeout=0).get(_blink_session_id())
         stats = blink_detector.get_stats()
         frame_base64 = blink_detector.get_current_frame_base64()
         return jsonify({
@@ -430,20 +1521,163 @@ def get_blink_stats():
             'completed': stats['completed'],
             'frame': frame_base64
         })
+    except KeyError:
+        return jsonify({'error': 'Unknown or expired blink session'}), 404
+    except ResourceNotReady as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/blink_frame', methods=['POST'])
+def blink_frame():
+    """Accept one browser-captured frame (JPEG, or raw grayscale with width/height) for a session.
+
+    Frames that arrive while the previous one is still being processed
+    replace it, and frame_interval_ms tells the client how fast to send.
+    """
+    from blink_model import decode_client_frame
+
+    if (request.content_length or 0) > app.config['BLINK_MAX_FRAME_BYTES']:
+        return jsonify({'error': 'Frame too large'}), 413
+    try:
+        blink_detector = blink_loader.get(timeout=0).get(request.args.get('session_id'))
+    except KeyError:
+        return jsonify({'error': 'Unknown or expired blink session'}), 404
+    except ResourceNotReady as e:
+        return jsonify({'error': str(e)}), 503
+
+    try:
+        frame = decode_client_frame(
+            request.get_data(cache=False),
+            request.content_type,
+            width=request.args.get('width', type=int),
+            height=request.args.get('height', type=int)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    captured_ms = request.headers.get('X-Frame-Time', type=float)
+    accepted = blink_detector.submit_frame(frame, captured_ms / 1000.0 if captured_ms is not None else None)
+    stats = blink_detector.get_stats()
+    return jsonify({
+        'accepted': accepted,
+        'blink_count': stats['blink_count'],
+        'time_remaining': stats['time_remaining'],
+        'completed': stats['completed'],
+        'frame_interval_ms': round(blink_detector.suggested_interval() * 1000)
+    })
+
+
+@app.route('/blink_preview', methods=['GET'])
+def blink_preview():
+    """MJPEG stream of a session's annotated frames, shared with every viewer of that session."""
+    try:
+        blink_detector = blink_loader.get(timeout=0).get(request.args.get('session_id'))
+    except KeyError:
+        return jsonify({'error': 'Unknown or expired blink session'}), 404
+    except ResourceNotReady as e:
+        return jsonify({'error': str(e)}), 503
+
+    def generate():
+        for jpeg in blink_detector.preview_frames():
+            yield (b'--frame\r\nContent-Type: image/jpeg\r\nContent-Length: '
+                   + str(len(jpeg)).encode() + b'\r\n\r\n' + jpeg + b'\r\n')
+
+    return Response(generate(), mimetype='multipart/x-mixed-replace; boundary=frame',
+                    headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/blink_events', methods=['GET'])
+def blink_events():
+    """Server-sent events with a session's stats, pushed whenever they change."""
+    try:
+        blink_detector = blink_loader.get(timeout=0).get(request.args.get('session_id'))
+    except KeyError:
+        return jsonify({'error': 'Unknown or expired blink session'}), 404
+    except ResourceNotReady as e:
+        return jsonify({'error': str(e)}), 503
+
+    def generate():
+        last = None
+        while True:
+            stats = blink_detector.get_stats()
+            # the frame counters move on every poll; they ride along when something else changes
+            state = {k: v for k, v in stats.items() if k not in ('frames_received', 'frames_dropped')}
+            if state != last:
+                yield f'data: {app.json.dumps(stats)}\n\n'
+                last = state
+            if stats['completed']:
+                return
+            time.sleep(0.25)
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-store', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/stop_blink_detection', methods=['POST'])
 def stop_blink_detection():
+    """Stop a session and return its final results; the session is closed afterwards."""
     try:
-        blink_detector.stop()
-        results = blink_detector.get_final_results()
-        return jsonify(results)
+        blink_detector = blink_loader.get(timeout=0).close(_blink_session_id())
+        if blink_detector is None:
+            return jsonify({'error': 'Unknown or expired blink session'}), 404
+        return jsonify(blink_detector.get_final_results())
+    except ResourceNotReady as e:
+        return jsonify({'error': str(e)}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def _analyze_blink_video_job(file_path, stride, width):
+    from blink_video import analyze_video
+    try:
+        return analyze_video(file_path, stride=stride, width=width)
+    finally:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+@app.route('/analyze_blink_video', methods=['POST'])
+def analyze_blink_video():
+    """Queue blink analysis of an uploaded recording ('video' file field).
+
+    Optional form fields: stride (process every n-th frame) and width
+    (downscale before FaceMesh). Poll /jobs/<job_id> for blink count, blink
+    timestamps, per-frame EAR and processing frames/sec.
+    """
+    # room for the form fields; _stream_to_file enforces the exact limit on the video itself
+    request.max_content_length = app.config['BLINK_VIDEO_MAX_BYTES'] + 1024 * 1024
+    if 'video' not in request.files:
+        return jsonify({'error': 'No video uploaded'}), 400
+    stride = request.form.get('stride', 1, type=int)
+    width = request.form.get('width', type=int)
+    if stride < 1 or (width is not None and width < 64):
+        return jsonify({'error': 'stride must be >= 1 and width >= 64'}), 400
+
+    video = request.files['video']
+    ext = os.path.splitext(video.filename or '')[1].lower()
+    if not ext[1:].isalnum() or len(ext) > 6:
+        ext = '.mp4'
+    file_path = upload_store.staging_path(ext)
+    try:
+        _stream_to_file(video.stream, file_path, app.config['BLINK_VIDEO_MAX_BYTES'])
+    except UploadTooLarge as e:
+        return jsonify({'error': str(e)}), 413
+
+    job_id = video_jobs.submit(_analyze_blink_video_job, file_path, stride, width)
+    return jsonify({'job_id': job_id, 'status': 'queued', 'status_url': f'/jobs/{job_id}'}), 202
+
+
+@app.route('/blink_sessions_stats', methods=['GET'])
+def blink_sessions_stats():
+    """Active and rejected blink sessions against the FaceMesh pool capacity."""
+    try:
+        return jsonify(blink_loader.get(timeout=0).stats())
+    except ResourceNotReady as e:
+        return jsonify({'error': str(e)}), 503
+
+
 @app.route('/save_blink_result', methods=['POST'])
 def save_blink_result():
     """Save completed blink test results linked to a patient."""
@@ -455,19 +1689,107 @@ def save_blink_result():
     if not patient_id:
         return jsonify({'error': 'patient_id required'}), 400
 
-    result = BlinkResult(
-        patient_id=patient_id,
-        blink_count=data.get('blink_count', 0),
-        duration=data.get('duration', 0)
-    )
-    db.session.add(result)
-    db.session.commit()
-    return jsonify({'status': 'saved', 'id': result.id})
+    # the EAR series recorded by the session, if the client says which one it was
+    series = None
+    if data.get('session_id') and blink_loader.ready:
+        series = blink_loader.get(timeout=0).take_series(data['session_id'])
+
+    def add_result(session):
+        result = BlinkResult(
+            patient_id=patient_id,
+            blink_count=data.get('blink_count', 0),
+            duration=data.get('duration', 0)
+        )
+        if series is not None:
+            result.series = BlinkSeries(sample_count=ear_series.sample_count(series), data=series)
+        session.add(result)
+        _update_summary(patient_id, 'blink_test_count', latest_blink_count=result.blink_count,
+                        latest_blink_at=datetime.utcnow())
+        return result
+
+    return jsonify({'status': 'saved', 'id': _write(add_result, patient_id)})
+
+def rescore_blink_results(ear_threshold, closed_frames, write=False, chunk_size=5000):
+    """Recompute blink counts of every stored EAR series under new thresholds.
+
+    Series are decoded and scored chunk_size at a time. Returns
+    {'sessions', 'changed': [(blink_result_id, stored, rescored)], 'seconds'};
+    with write=True changed counts are saved and patient summaries rebuilt.
+    """
+    started = time.perf_counter()
+    query = db.session.query(
+        BlinkResult.id, BlinkResult.patient_id, BlinkResult.blink_count, BlinkSeries.data
+    ).join(BlinkSeries, BlinkSeries.blink_result_id == BlinkResult.id).order_by(BlinkResult.id)
+
+    sessions, changed = 0, []
+    chunk = []
+
+    def score(rows):
+        counts = ear_series.rescore([ear_series.decode(row.data) for row in rows],
+                                    ear_threshold=ear_threshold, closed_frames=closed_frames)
+        for row, count in zip(rows, counts.tolist()):
+            if count != row.blink_count:
+                changed.append((row.id, row.blink_count, count))
+
+    for row in query.yield_per(chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            score(chunk)
+            sessions += len(chunk)
+            chunk = []
+    if chunk:
+        score(chunk)
+        sessions += len(chunk)
+
+    if write and changed:
+        db.session.execute(db.update(BlinkResult), [{'id': rid, 'blink_count': new} for rid, _, new in changed])
+        db.session.commit()
+        rebuild_patient_summaries()
+        # usually run from the CLI, whose cache is not the server's
+        patient_cache.invalidate_all()
+    return {'sessions': sessions, 'changed': changed, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+@app.cli.command('rescore-blinks')
+@click.option('--threshold', type=float, default=0.20, help='EAR below which an eye counts as closed')
+@click.option('--closed-frames', type=int, default=2, help='closed frames (at 30 fps) that make a blink')
+@click.option('--write', is_flag=True, help='save changed counts instead of only reporting them')
+def rescore_blinks_command(threshold, closed_frames, write):
+    """Re-score every stored blink session under a new EAR threshold / closed-frame count."""
+    result = rescore_blink_results(threshold, closed_frames, write=write)
+    for rid, old, new in result['changed']:
+        print(f"blink_result {rid}: {old} -> {new}")
+    print(f"Re-scored {result['sessions']} sessions in {result['seconds']}s, "
+          f"{len(result['changed'])} changed" + (' (saved)' if write and result['changed'] else ''))
+
+
+@app.route('/rescore_blink_results', methods=['POST'])
+def rescore_blink_results_route():
+    """Dry-run re-scoring of stored blink sessions: JSON {ear_threshold, closed_frames}."""
+    data = request.get_json(silent=True) or {}
+    try:
+        ear_threshold = float(data.get('ear_threshold', 0.20))
+        closed_frames = int(data.get('closed_frames', 2))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'ear_threshold must be a number and closed_frames an integer'}), 400
+    if closed_frames < 1:
+        return jsonify({'error': 'closed_frames must be >= 1'}), 400
+    result = rescore_blink_results(ear_threshold, closed_frames)
+    result['changed'] = [{'id': rid, 'blink_count': old, 'rescored': new} for rid, old, new in result['changed']]
+    return jsonify(result)
 
 # Typing test
+TYPING_METRIC_COLUMNS = ('wpm', 'accuracy', 'risk_score', 'backspace_count', 'pause_count',
+                         'hesitation_count', 'avg_key_delay')
+
+
 @app.route('/save_typing_result', methods=['POST'])
 def save_typing_result():
-    """Save completed typing test results linked to a patient."""
+    """Save completed typing test results linked to a patient.
+
+    Returns {'status', 'id', 'metrics'}: metrics holds the values stored,
+    which are derived from 'keystrokes' when sent and override the client's.
+    """
     data = request.json
     if not data:
         return jsonify({'error': 'No data provided'}), 400
@@ -476,36 +1798,140 @@ def save_typing_result():
     if not patient_id:
         return jsonify({'error': 'patient_id required'}), 400
 
-    result = TypingResult(
-        patient_id=patient_id,
-        wpm=data.get('wpm', 0),
-        accuracy=data.get('accuracy', 0),
-        test_text=data.get('test_text', ''),
-        risk_score=data.get('risk_score'),
-        backspace_count=data.get('backspace_count'),
-        pause_count=data.get('pause_count'),
-        hesitation_count=data.get('hesitation_count'),
-        avg_key_delay=data.get('avg_key_delay')
-    )
-    db.session.add(result)
-    db.session.commit()
-    return jsonify({'status': 'saved', 'id': result.id})
+    # with the raw keystroke stream, the metrics are derived here instead of trusted from the client
+    typing_metrics = {name: data.get(name) for name in TYPING_METRIC_COLUMNS}
+    stream = None
+    if data.get('keystrokes'):
+        try:
+            dt, kinds, total_ms = typing_features.parse_upload(data['keystrokes'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        typed_text = str(data.get('typed_text', ''))
+        scored = typing_features.score_session(dt, kinds, total_ms, typed_text, data.get('test_text', ''))
+        typing_metrics.update({name: scored[name] for name in typing_metrics})
+        stream = TypingKeystrokes(
+            event_count=len(dt),
+            typed_text=typed_text,
+            formula_version=typing_features.RISK_FORMULA_VERSION,
+            data=typing_features.encode(dt, kinds, total_ms)
+        )
 
-# Entry point
+    def add_result(session):
+        result = TypingResult(
+            patient_id=patient_id,
+            wpm=typing_metrics['wpm'] or 0,
+            accuracy=typing_metrics['accuracy'] or 0,
+            test_text=data.get('test_text', ''),
+            risk_score=typing_metrics['risk_score'],
+            backspace_count=typing_metrics['backspace_count'],
+            pause_count=typing_metrics['pause_count'],
+            hesitation_count=typing_metrics['hesitation_count'],
+            avg_key_delay=typing_metrics['avg_key_delay']
+        )
+        result.keystrokes = stream
+        session.add(result)
+        _update_summary(patient_id, 'typing_test_count', latest_typing_risk=result.risk_score,
+                        latest_typing_at=datetime.utcnow())
+        return result
+
+    return jsonify({'status': 'saved', 'id': _write(add_result, patient_id), 'metrics': typing_metrics})
+
+
+def rescore_typing_results(all_sessions=False, write=False, chunk_size=5000):
+    """Recompute typing metrics and risk from every stored keystroke stream.
+
+    Only streams scored with an older RISK_FORMULA_VERSION are considered
+    unless all_sessions is set. Returns {'sessions', 'changed': [(id, old
+    risk, new risk)], 'seconds'}; with write=True the metrics are saved and
+    patient summaries rebuilt.
+    """
+    started = time.perf_counter()
+    query = db.session.query(TypingResult, TypingKeystrokes).join(
+        TypingKeystrokes, TypingKeystrokes.typing_result_id == TypingResult.id
+    ).order_by(TypingResult.id)
+    if not all_sessions:
+        query = query.filter(db.or_(TypingKeystrokes.formula_version.is_(None),
+                                    TypingKeystrokes.formula_version != typing_features.RISK_FORMULA_VERSION))
+
+    sessions, changed, updates = 0, [], []
+
+    def score(rows):
+        streams = [typing_features.decode(k.data) for _, k in rows]
+        texts = [typing_features.text_stats(k.typed_text or '', r.test_text or '') for r, k in rows]
+        f = typing_features.features(streams, texts)
+        risks = typing_features.risk_scores(f)
+        for i, (r, k) in enumerate(rows):
+            new = {
+                'wpm': int(f['wpm'][i]),
+                'accuracy': int(f['accuracy'][i]),
+                'risk_score': int(risks[i]),
+                'backspace_count': int(f['backspace_count'][i]),
+                'pause_count': int(f['pause_count'][i]),
+                'hesitation_count': int(f['hesitation_count'][i]),
+                'avg_key_delay': int(typing_features.round_half_up(f['avg_key_delay'][i]))
+            }
+            if new['risk_score'] != r.risk_score:
+                changed.append((r.id, r.risk_score, new['risk_score']))
+            updates.append((r.id, new))
+
+    chunk = []
+    for row in query.yield_per(chunk_size):
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            score(chunk)
+            sessions += len(chunk)
+            chunk = []
+    if chunk:
+        score(chunk)
+        sessions += len(chunk)
+
+    if write and updates:
+        db.session.execute(db.update(TypingResult), [{'id': rid, **new} for rid, new in updates])
+        db.session.execute(db.update(TypingKeystrokes), [
+            {'typing_result_id': rid, 'formula_version': typing_features.RISK_FORMULA_VERSION} for rid, _ in updates
+        ])
+        db.session.commit()
+        rebuild_patient_summaries()
+        # usually run from the CLI, whose cache is not the server's
+        patient_cache.invalidate_all()
+    return {'sessions': sessions, 'changed': changed, 'seconds': round(time.perf_counter() - started, 3)}
+
+
+@app.cli.command('rescore-typing')
+@click.option('--all', 'all_sessions', is_flag=True, help='re-score every stream, not only older formula versions')
+@click.option('--write', is_flag=True, help='save recomputed metrics instead of only reporting them')
+def rescore_typing_command(all_sessions, write):
+    """Re-derive typing metrics and risk scores from the stored keystroke streams."""
+    result = rescore_typing_results(all_sessions=all_sessions, write=write)
+    for rid, old, new in result['changed']:
+        print(f"typing_result {rid}: risk {old} -> {new}")
+    print(f"Re-scored {result['sessions']} sessions in {result['seconds']}s, "
+          f"{len(result['changed'])} risk scores changed" + (' (saved)' if write else ''))
+
+# Prefork workers
+def init_worker(index, torch_threads):
+    """Prepare a worker just forked by gunicorn (post_fork); it accepts connections only once this returns."""
+    global process
+    process = psutil.Process()
+    # pooled connections belong to the master; the worker opens its own
+    db.engine.dispose(close=False)
+    metrics.share(os.path.join(app.instance_path, 'metrics'))
+
+    import torch
+    torch.set_num_threads(torch_threads)
+    started = time.perf_counter()
+    scan_model.get(timeout=0).warmup()
+    try:
+        blink_loader.get()
+    except ResourceNotReady as e:
+        print(f"Worker {index}: {e}")
+    print(f"Worker {index} (pid {os.getpid()}) warmed up in {time.perf_counter() - started:.1f}s "
+          f"with {torch_threads} torch threads")
+
+
+# Entry point: the development server; production runs `gunicorn -c gunicorn.conf.py app:app`
 if __name__ == '__main__':
     with app.app_context():
-        for col in ['password']:
-            try:
-                db.session.execute(db.text(f'ALTER TABLE patient ADD COLUMN {col} VARCHAR(255)'))
-                db.session.commit()
-            except Exception:
-                db.session.rollback()
-        for col in ['risk_score', 'backspace_count', 'pause_count', 'hesitation_count', 'avg_key_delay']:
-            try:
-                db.session.execute(db.text(f'ALTER TABLE typing_result ADD COLUMN {col} INTEGER'))
-                db.session.commit()
-            except Exception:
-                db.session.rollback()
-        db.create_all()
+        run_migrations(db, upload_store, rebuild_patient_summaries)
 
     app.run(debug=True, use_reloader=False, port=5000)
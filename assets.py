@@ -0,0 +1,243 @@
+"""Static asset build and serving.
+
+The build step copies css/, js/, fonts/ and images/ into a build directory
+under content-hashed names (bootstrap.min.<hash>.css), rewrites references
+to them in CSS and HTML, pre-generates gzip (and brotli, when the optional
+'brotli' package is installed) variants, optionally adds WebP/resized image
+variants, and writes manifest.json.
+
+  python assets.py [--out dist] [--images] [--widths 480,960]
+
+At runtime AssetServer serves files from the build directory, picking the
+precompressed variant from Accept-Encoding. Fingerprinted files are sent
+with immutable one-year cache headers; HTML pages are revalidated.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+from flask import send_file
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ASSET_DIRS = ('fonts', 'images', 'css', 'js')
+COMPRESSIBLE = {'.css', '.js', '.html', '.svg', '.json', '.txt', '.eot', '.ttf', '.otf'}
+IMAGE_VARIANT_EXTS = {'.jpg', '.jpeg', '.png'}
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+HTML_REF = re.compile(r'((?:src|href)\s*=\s*)([\'"])([^\'"]+)\2')
+
+
+def _digest(data):
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def _fingerprinted(rel_path, data):
+    root, ext = posixpath.splitext(rel_path)
+    return f'{root}.{_digest(data)}{ext}'
+
+
+def _split_suffix(ref):
+    """'a.woff?v=1#x' -> ('a.woff', '?v=1#x')."""
+    cut = min([i for i in (ref.find('?'), ref.find('#')) if i >= 0], default=len(ref))
+    return ref[:cut], ref[cut:]
+
+
+def _write(out_dir, rel_path, data):
+    path = os.path.join(out_dir, *rel_path.split('/'))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    ext = posixpath.splitext(rel_path)[1].lower()
+    if ext in COMPRESSIBLE:
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+
+def _rewrite_css(css, css_rel, manifest):
+    base = posixpath.dirname(css_rel)
+
+    def replace(m):
+        quote, ref = m.group(1), m.group(2).strip()
+        target, suffix = _split_suffix(ref)
+        if not target or '://' in target or target.startswith('data:'):
+            return m.group(0)
+        resolved = posixpath.normpath(posixpath.join(base, target))
+        if resolved not in manifest['files']:
+            return m.group(0)
+        new_ref = posixpath.relpath(manifest['files'][resolved], base) + suffix
+        return f'url({quote}{new_ref}{quote})'
+
+    return CSS_URL.sub(replace, css)
+
+
+def _rewrite_html(html, manifest):
+    def resolve(ref):
+        target, suffix = _split_suffix(ref)
+        key = target.lstrip('/')
+        if key.startswith('./'):
+            key = key[2:]
+        if key in manifest['files']:
+            return ('/' if target.startswith('/') else '') + manifest['files'][key] + suffix
+        return None
+
+    def replace_attr(m):
+        new_ref = resolve(m.group(3))
+        return m.group(0) if new_ref is None else f'{m.group(1)}{m.group(2)}{new_ref}{m.group(2)}'
+
+    def replace_url(m):
+        new_ref = resolve(m.group(2).strip())
+        return m.group(0) if new_ref is None else f'url({m.group(1)}{new_ref}{m.group(1)})'
+
+    return CSS_URL.sub(replace_url, HTML_REF.sub(replace_attr, html))
+
+
+def _image_variants(src_path, rel_path, out_dir, widths, manifest):
+    from PIL import Image
+
+    variants = {}
+    with Image.open(src_path) as img:
+        img.load()
+        sizes = [(None, img)]
+        for width in widths:
+            if width < img.width:
+                height = round(img.height * width / img.width)
+                sizes.append((width, img.resize((width, height), Image.LANCZOS)))
+        root = posixpath.splitext(rel_path)[0]
+        for width, im in sizes:
+            tmp = os.path.join(out_dir, '.variant.webp')
+            im.save(tmp, 'WEBP', quality=80, method=6)
+            with open(tmp, 'rb') as f:
+                data = f.read()
+            os.remove(tmp)
+            name = f'{root}-{width}w' if width else root
+            variant_rel = f'{name}.{_digest(data)}.webp'
+            _write(out_dir, variant_rel, data)
+            variants['webp' if width is None else f'{width}w'] = variant_rel
+    manifest['variants'][rel_path] = variants
+
+
+def build(src_dir='.', out_dir='dist', images=False, widths=(480, 960)):
+    """Build fingerprinted, precompressed assets into out_dir; returns the manifest."""
+    if os.path.isdir(out_dir):
+        shutil.rmtree(out_dir)
+    os.makedirs(out_dir)
+    manifest = {'files': {}, 'variants': {}, 'html': []}
+
+    # fonts and images first so CSS can point at their fingerprinted names
+    for asset_dir in ASSET_DIRS:
+        for dirpath, _, filenames in os.walk(os.path.join(src_dir, asset_dir)):
+            for fname in sorted(filenames):
+                src_path = os.path.join(dirpath, fname)
+                rel_path = os.path.relpath(src_path, src_dir).replace(os.sep, '/')
+                with open(src_path, 'rb') as f:
+                    data = f.read()
+                if rel_path.endswith('.css'):
+                    data = _rewrite_css(data.decode('utf-8'), rel_path, manifest).encode('utf-8')
+                out_rel = _fingerprinted(rel_path, data)
+                _write(out_dir, out_rel, data)
+                manifest['files'][rel_path] = out_rel
+                if images and posixpath.splitext(rel_path)[1].lower() in IMAGE_VARIANT_EXTS:
+                    _image_variants(src_path, rel_path, out_dir, widths, manifest)
+
+    for fname in sorted(os.listdir(src_dir)):
+        if fname.endswith('.html'):
+            with open(os.path.join(src_dir, fname), encoding='utf-8') as f:
+                html = _rewrite_html(f.read(), manifest)
+            _write(out_dir, fname, html.encode('utf-8'))
+            manifest['html'].append(fname)
+
+    with open(os.path.join(out_dir, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+class AssetServer:
+    """Serves a build produced by build(); inactive when no manifest exists."""
+
+    def __init__(self, build_dir):
+        self.build_dir = build_dir
+        self.immutable = set()
+        self.webp = {}
+        self.html = set()
+        manifest_path = os.path.join(build_dir, 'manifest.json')
+        if not os.path.exists(manifest_path):
+            return
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        for src, out in manifest['files'].items():
+            self.immutable.add(out)
+            webp = manifest['variants'].get(src, {}).get('webp')
+            if webp:
+                self.webp[out] = webp
+        for variants in manifest['variants'].values():
+            self.immutable.update(variants.values())
+        self.html = set(manifest['html'])
+
+    @property
+    def active(self):
+        return bool(self.immutable)
+
+    def response(self, path, request):
+        """Response for path from the build, or None to fall back to the source tree."""
+        path = path.lstrip('/') or 'index.html'
+        negotiated = path in self.webp
+        if path in self.html:
+            cache_control = REVALIDATE
+        elif path in self.immutable:
+            cache_control = IMMUTABLE
+            webp = self.webp.get(path)
+            if webp and 'image/webp' in request.headers.get('Accept', ''):
+                path = webp
+        else:
+            return None
+
+        file_path = os.path.join(self.build_dir, *path.split('/'))
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        accepted = request.accept_encodings
+        encoding = None
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            if accepted[candidate] and os.path.exists(file_path + suffix):
+                encoding, file_path = candidate, file_path + suffix
+                break
+
+        response = send_file(file_path, mimetype=mimetype, conditional=True, etag=True)
+        response.headers['Cache-Control'] = cache_control
+        response.vary.add('Accept-Encoding')
+        if negotiated:
+            response.vary.add('Accept')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--src', default='.')
+    parser.add_argument('--out', default='dist')
+    parser.add_argument('--images', action='store_true', help='also generate WebP and resized image variants')
+    parser.add_argument('--widths', default='480,960', help='comma-separated widths for resized variants')
+    args = parser.parse_args()
+
+    widths = [int(w) for w in args.widths.split(',') if w]
+    manifest = build(args.src, args.out, images=args.images, widths=widths)
+    print(f"Built {len(manifest['files'])} assets and {len(manifest['html'])} pages into {args.out}"
+          + ('' if brotli else ' (brotli not installed: gzip only)'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""Per-frame benchmark of the BlinkDetector hot path on a recorded video.
+
+Compares the original loop (Python landmark tuples, np.array-per-distance
+EAR, overlays and a full-resolution frame copy on every frame) with the
+vectorized path under several settings. Frames are decoded up front so
+only per-frame processing is timed.
+
+  python -m benchmarks.blink_loop fixture.mp4 [--frames 300] [--width 320] [--out result.json]
+"""
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from blink_model import BlinkDetector, create_face_mesh
+
+
+def legacy_process_frame(detector, frame):
+    """The per-frame body of _detection_loop before vectorization, kept as the baseline."""
+    frame = cv2.flip(frame, 1)
+    h, w, _ = frame.shape
+    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    results = detector.face_mesh.process(rgb)
+
+    if results.multi_face_landmarks:
+        lm = results.multi_face_landmarks[0].landmark
+
+        left_eye = [(int(lm[i].x * w), int(lm[i].y * h)) for i in detector.LEFT_EYE]
+        right_eye = [(int(lm[i].x * w), int(lm[i].y * h)) for i in detector.RIGHT_EYE]
+
+        for point in left_eye:
+            cv2.circle(frame, point, 2, (0, 255, 0), -1)
+        for point in right_eye:
+            cv2.circle(frame, point, 2, (0, 255, 0), -1)
+        for eye in (left_eye, right_eye):
+            for i in range(len(eye)):
+                cv2.line(frame, eye[i], eye[(i + 1) % len(eye)], (255, 0, 0), 1)
+
+        left_ear = detector.eye_aspect_ratio(left_eye)
+        right_ear = detector.eye_aspect_ratio(right_eye)
+        if left_ear < detector.EAR_THRESHOLD and right_ear < detector.EAR_THRESHOLD:
+            detector.closed_counter += 1
+        else:
+            if detector.closed_counter >= detector.CLOSED_FRAMES:
+                detector.blink_total += 1
+            detector.closed_counter = 0
+
+    with detector.frame_lock:
+        detector.current_frame = frame.copy()
+
+
+def load_frames(path, limit):
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise SystemExit(f'Could not open video: {path}')
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    frames = []
+    while len(frames) < limit:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames, fps
+
+
+def summarize(latencies):
+    ms = np.asarray(latencies) * 1000
+    return {
+        'frames': len(ms),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'fps': round(len(ms) / (ms.sum() / 1000), 1)
+    }
+
+
+def run_variant(frames, fps, legacy=False, **options):
+    detector = BlinkDetector(face_mesh=create_face_mesh(), **options)
+    detector.warmup()
+    latencies = []
+    for index, frame in enumerate(frames):
+        started = time.perf_counter()
+        if legacy:
+            legacy_process_frame(detector, frame)
+        else:
+            detector.process_frame(frame, index / fps)
+        latencies.append(time.perf_counter() - started)
+    detector.face_mesh.close()
+    result = summarize(latencies)
+    result['blinks'] = detector.blink_total
+    return result
+
+
+def ear_microbenchmark(frames, iterations):
+    """Landmarks -> EAR only, without FaceMesh, on the first frame with a face."""
+    detector = BlinkDetector(face_mesh=create_face_mesh())
+    for frame in frames:
+        h, w, _ = frame.shape
+        results = detector.face_mesh.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if results.multi_face_landmarks:
+            lm = results.multi_face_landmarks[0].landmark
+            break
+    else:
+        return None
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        left_eye = [(int(lm[i].x * w), int(lm[i].y * h)) for i in detector.LEFT_EYE]
+        right_eye = [(int(lm[i].x * w), int(lm[i].y * h)) for i in detector.RIGHT_EYE]
+        detector.eye_aspect_ratio(left_eye), detector.eye_aspect_ratio(right_eye)
+    legacy = time.perf_counter() - started
+
+    points = detector._points
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for k, i in enumerate(detector.eye_landmarks):
+            point = lm[i]
+            points[k, 0] = point.x
+            points[k, 1] = point.y
+        detector._scale[0], detector._scale[1] = w, h
+        np.multiply(points, detector._scale, out=points)
+        detector.eye_aspect_ratios(points)
+    fast = time.perf_counter() - started
+
+    return {
+        'iterations': iterations,
+        'legacy_us': round(legacy / iterations * 1e6, 2),
+        'vectorized_us': round(fast / iterations * 1e6, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video', help='recorded fixture with a face in view')
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=320, help='process_width for the downscaled variants')
+    parser.add_argument('--ear-iterations', type=int, default=20000)
+    parser.add_argument('--out', default=None, help='write results as JSON')
+    args = parser.parse_args()
+
+    frames, fps = load_frames(args.video, args.frames)
+    if not frames:
+        raise SystemExit('No frames decoded')
+
+    variants = {
+        'legacy': dict(legacy=True),
+        'vectorized': dict(),
+        'vectorized_no_overlays': dict(overlays=False),
+        f'no_overlays_width_{args.width}': dict(overlays=False, process_width=args.width),
+        'no_overlays_roi': dict(overlays=False, crop_roi=True),
+        f'no_overlays_roi_width_{args.width}': dict(overlays=False, crop_roi=True, process_width=args.width)
+    }
+    results = {'video': args.video, 'frame_size': list(frames[0].shape[:2]), 'variants': {}}
+    for name, options in variants.items():
+        results['variants'][name] = run_variant(frames, fps, **options)
+        r = results['variants'][name]
+        print(f"{name:32s} p50 {r['p50_ms']:8.2f} ms  p95 {r['p95_ms']:8.2f} ms  "
+              f"{r['fps']:7.1f} fps  {r['blinks']} blinks", file=sys.stderr)
+
+    results['ear_only'] = ear_microbenchmark(frames, args.ear_iterations)
+    if results['ear_only']:
+        e = results['ear_only']
+        print(f"EAR only: {e['legacy_us']} us legacy, {e['vectorized_us']} us vectorized", file=sys.stderr)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+"""Concurrent HTTP load generator for a running server.
+
+Each scenario is driven by --concurrency threads for --duration seconds and
+reports throughput, error counts and p50/p95/p99 latency. Patients and
+credentials come from the manifest written by benchmarks.seed.
+
+  python -m benchmarks.load http://127.0.0.1:5000 --manifest bench.db.json \\
+      [--scenarios get_patients,get_patient] [--image scan.png] [--out load.json]
+
+The predict scenario appends random bytes after the image data, so each
+request misses the prediction cache and measures real inference.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+import requests
+
+from benchmarks.report import latency_summary, metadata, write
+
+
+def _patient_id(ctx, rng):
+    return ctx['first_patient_id'] + rng.randrange(ctx['patients'])
+
+
+def get_patients(http, base, ctx, rng):
+    return http.get(f'{base}/get_patients', params={'limit': 50})
+
+
+def get_patient(http, base, ctx, rng):
+    return http.get(f'{base}/get_patient/{_patient_id(ctx, rng)}')
+
+
+def get_patient_summaries(http, base, ctx, rng):
+    return http.get(f'{base}/get_patient_summaries', params={'limit': 50})
+
+
+def admin_login(http, base, ctx, rng):
+    return http.post(f'{base}/admin_login', json={'email': ctx['admin_email'], 'password': ctx['password']})
+
+
+def login_patient(http, base, ctx, rng):
+    email = f'bench{_patient_id(ctx, rng)}@example.com'
+    return http.post(f'{base}/login_patient', json={'email': email, 'password': ctx['password']})
+
+
+def save_blink_result(http, base, ctx, rng):
+    return http.post(f'{base}/save_blink_result', json={
+        'patient_id': _patient_id(ctx, rng), 'blink_count': rng.randint(0, 20), 'duration': 30.0
+    })
+
+
+def save_typing_result(http, base, ctx, rng):
+    return http.post(f'{base}/save_typing_result', json={
+        'patient_id': _patient_id(ctx, rng), 'wpm': rng.randint(10, 80), 'accuracy': rng.randint(60, 100),
+        'test_text': 'benchmark', 'risk_score': rng.randint(0, 100), 'backspace_count': rng.randint(0, 30),
+        'pause_count': rng.randint(0, 5), 'hesitation_count': rng.randint(0, 10), 'avg_key_delay': rng.randint(100, 900)
+    })
+
+
+def predict(http, base, ctx, rng):
+    body = ctx['image'] + os.urandom(16)
+    return http.post(f'{base}/predict', data=body, headers={'Content-Type': 'image/png'}, params={
+        'patient_id': _patient_id(ctx, rng), 'scan_type': 'MRI', 'scan_date': '2026-01-01'
+    })
+
+
+SCENARIOS = {fn.__name__: fn for fn in (
+    get_patients, get_patient, get_patient_summaries, admin_login, login_patient,
+    save_blink_result, save_typing_result, predict
+)}
+DEFAULT_SCENARIOS = [name for name in SCENARIOS if name != 'predict']
+
+
+def run_scenario(base, name, ctx, concurrency=8, duration=10.0, timeout=60.0):
+    """Drive one scenario; returns its throughput and latency summary."""
+    fn = SCENARIOS[name]
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(index):
+        rng = random.Random(f'{name}-{index}')
+        with requests.Session() as http:
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    status = fn(http, base, ctx, rng).status_code
+                except requests.RequestException:
+                    status = 'error'
+                elapsed = time.perf_counter() - started
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(duration + timeout)
+    wall = time.perf_counter() - started
+
+    result = latency_summary(latencies)
+    result['concurrency'] = concurrency
+    result['throughput_rps'] = round(len(latencies) / wall, 1) if wall else None
+    result['errors'] = sum(count for status, count in statuses.items() if status == 'error' or status >= 400)
+    result['statuses'] = {str(status): count for status, count in statuses.items()}
+    return result
+
+
+def run(base, ctx, scenarios, concurrency, duration):
+    results = {}
+    for name in scenarios:
+        r = results[name] = run_scenario(base, name, ctx, concurrency=concurrency, duration=duration)
+        print(f"{name:24s} {r.get('throughput_rps', 0):8.1f} req/s  p50 {r.get('p50_ms', 0):8.2f}  "
+              f"p95 {r.get('p95_ms', 0):8.2f}  p99 {r.get('p99_ms', 0):8.2f} ms  errors {r['errors']}",
+              file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base_url')
+    parser.add_argument('--manifest', required=True, help='manifest written by benchmarks.seed')
+    parser.add_argument('--scenarios', default=','.join(DEFAULT_SCENARIOS),
+                        help=f"comma-separated, from: {', '.join(SCENARIOS)}")
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds per scenario')
+    parser.add_argument('--image', default=None, help='image file for the predict scenario')
+    parser.add_argument('--out', default=None, help='write results as JSON')
+    args = parser.parse_args()
+
+    with open(args.manifest) as f:
+        ctx = json.load(f)
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    if 'predict' in scenarios:
+        if not args.image:
+            raise SystemExit('The predict scenario needs --image')
+        with open(args.image, 'rb') as f:
+            ctx['image'] = f.read()
+
+    results = metadata(base_url=args.base_url, rows=ctx['rows'], concurrency=args.concurrency,
+                       duration=args.duration)
+    results['scenarios'] = run(args.base_url.rstrip('/'), ctx, scenarios, args.concurrency, args.duration)
+    if args.out:
+        write(results, args.out)
+
+
+if __name__ == '__main__':
+    main()
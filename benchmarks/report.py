@@ -0,0 +1,70 @@
+"""Shared result handling for the benchmarks: latency summaries, run metadata and regression checks."""
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+
+def latency_summary(latencies):
+    """count / mean / p50 / p95 / p99 in milliseconds for a list of durations in seconds."""
+    ms = np.asarray(latencies, dtype=np.float64) * 1000
+    if not len(ms):
+        return {'count': 0}
+    return {
+        'count': int(len(ms)),
+        'mean_ms': round(float(ms.mean()), 3),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p95_ms': round(float(np.percentile(ms, 95)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3)
+    }
+
+
+def metadata(**extra):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit or None,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        **extra
+    }
+
+
+def write(results, path):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def _flatten(results, prefix=''):
+    """{'a': {'b': {'p95_ms': ..}}} -> {'a/b': {'p95_ms': ..}} for every dict holding latency numbers."""
+    flat = {}
+    for key, value in results.items():
+        if not isinstance(value, dict):
+            continue
+        name = f'{prefix}/{key}' if prefix else key
+        if 'p95_ms' in value:
+            flat[name] = value
+        flat.update(_flatten(value, name))
+    return flat
+
+
+def regressions(results, baseline, tolerance=0.15):
+    """Entries whose p95 latency rose, or throughput fell, by more than tolerance versus baseline."""
+    found = []
+    current, previous = _flatten(results), _flatten(baseline)
+    for name, now in current.items():
+        before = previous.get(name)
+        if not before:
+            continue
+        if before.get('p95_ms') and now['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+            found.append(f"{name}: p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+        for rate in ('throughput_rps', 'fps'):
+            if before.get(rate) and now.get(rate) is not None and now[rate] < before[rate] * (1 - tolerance):
+                found.append(f"{name}: {rate} {before[rate]} -> {now[rate]}")
+    return found
@@ -0,0 +1,138 @@
+"""Full benchmark suite: seed, serve, load, and compare against a baseline.
+
+For each scale, a SQLite database under benchmarks/data/ is seeded once
+and reused on later runs. Each run starts the app against a temporary copy
+of it, so rows written by the save and predict scenarios never reach the
+next run, drives the HTTP scenarios, and stops the server. With --video, the
+BlinkDetector per-frame microbenchmark runs too. Results go to
+benchmarks/results/<timestamp>.json. With --baseline, the run fails when
+p95 latency or throughput regress by more than --tolerance.
+
+  python -m benchmarks.run [--scales 1000,100000,1000000] [--image scan.png] [--video fixture.mp4] \\
+      [--baseline benchmarks/results/previous.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from benchmarks import load, report
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+
+def ensure_seeded(rows):
+    db_path = os.path.join(HERE, 'data', f'bench-{rows}.db')
+    manifest = db_path + '.json'
+    if not os.path.exists(manifest):
+        subprocess.run([sys.executable, '-m', 'benchmarks.seed', '--db', db_path, '--rows', str(rows)],
+                       cwd=ROOT, check=True)
+    return db_path, manifest
+
+
+def working_copy(db_path, directory):
+    """Copy the seeded database into directory; the backup API also carries anything still in its WAL."""
+    path = os.path.join(directory, os.path.basename(db_path))
+    src, dst = sqlite3.connect(db_path), sqlite3.connect(path)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+    return path
+
+
+def start_server(db_path, port, wait_ready):
+    env = dict(os.environ, DATABASE_URL='sqlite:///' + db_path)
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'flask', '--app', 'app', 'run', '--port', str(port), '--with-threads', '--no-reload'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 300
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit('Server exited during startup')
+        try:
+            r = requests.get(f'{base}/ready', timeout=2)
+            if r.status_code == 200 or (not wait_ready and r.status_code == 503):
+                return server, base
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise SystemExit('Server did not become ready')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', default='1000,100000,1000000', help='rows per result table, comma-separated')
+    parser.add_argument('--scenarios', default=','.join(load.DEFAULT_SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--image', default=None, help='adds the predict scenario with this image')
+    parser.add_argument('--video', default=None, help='adds the BlinkDetector per-frame benchmark on this video')
+    parser.add_argument('--out', default=None)
+    parser.add_argument('--baseline', default=None, help='earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    args = parser.parse_args()
+
+    scenarios = [s for s in args.scenarios.split(',') if s]
+    image = None
+    if args.image:
+        scenarios.append('predict')
+        with open(args.image, 'rb') as f:
+            image = f.read()
+
+    results = report.metadata(concurrency=args.concurrency, duration=args.duration)
+    results['scales'] = {}
+    for rows in (int(s) for s in args.scales.split(',') if s):
+        db_path, manifest = ensure_seeded(rows)
+        with open(manifest) as f:
+            ctx = json.load(f)
+        ctx['image'] = image
+        workdir = tempfile.mkdtemp(prefix='bench-')
+        try:
+            server, base = start_server(working_copy(db_path, workdir), args.port, wait_ready=image is not None)
+            try:
+                print(f'--- {rows} rows', file=sys.stderr)
+                results['scales'][str(rows)] = load.run(base, ctx, scenarios, args.concurrency, args.duration)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.video:
+        out = os.path.join(HERE, 'results', 'blink_loop.tmp.json')
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        subprocess.run([sys.executable, '-m', 'benchmarks.blink_loop', args.video, '--out', out], cwd=ROOT, check=True)
+        with open(out) as f:
+            results['blink_loop'] = json.load(f)
+        os.remove(out)
+
+    path = args.out or os.path.join(HERE, 'results', time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    report.write(results, path)
+    print(f'Results written to {path}', file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = report.regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f'REGRESSION {line}', file=sys.stderr)
+        if found:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Seed a database with synthetic patients and test results.
+
+--rows rows are written to each of scan, blink_result and typing_result,
+spread over rows / 10 patients who all share one password, plus a
+benchmark admin. A manifest with the credentials and counts is written for
+benchmarks.load.
+
+  python -m benchmarks.seed --db benchmarks/data/bench-100000.db --rows 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+PASSWORD = 'bench-password'
+ADMIN_EMAIL = 'bench-admin@example.com'
+CLASSES = ('MildDemented', 'ModerateDemented', 'NonDemented', 'VeryMildDemented')
+BATCH = 10000
+
+
+def _batches(rows_fn, total):
+    for start in range(0, total, BATCH):
+        yield [rows_fn(i) for i in range(start, min(total, start + BATCH))]
+
+
+def seed(rows, seed_value=0):
+    """Insert the synthetic data through the app's models; returns the manifest."""
+    from werkzeug.security import generate_password_hash
+
+    import app as web
+
+    db = web.db
+    rng = random.Random(seed_value)
+    patients = max(1, rows // 10)
+    password_hash = generate_password_hash(PASSWORD)
+    now = datetime.utcnow()
+
+    def when():
+        return now - timedelta(seconds=rng.randrange(2 * 365 * 24 * 3600))
+
+    with web.app.app_context():
+        web.run_migrations(db, rebuild_summaries=web.rebuild_patient_summaries)
+        first_id = (db.session.query(db.func.max(web.Patient.id)).scalar() or 0) + 1
+
+        def patient(i):
+            return {
+                'name': f'Bench Patient {i}', 'age': rng.randint(55, 95), 'gender': rng.choice(('Male', 'Female')),
+                'email': f'bench{first_id + i}@example.com', 'password': password_hash,
+                'phone': f'555-{i:07d}', 'address': f'{i} Benchmark Road', 'created_at': when()
+            }
+
+        def owner():
+            return first_id + rng.randrange(patients)
+
+        def scan(i):
+            return {
+                'patient_id': owner(), 'file_path': f'uploads/bench-{i}.png', 'scan_type': 'MRI',
+                'scan_date': when().strftime('%Y-%m-%d'), 'predicted_class': rng.choice(CLASSES),
+                'confidence': round(rng.uniform(0.5, 1.0), 4), 'created_at': when()
+            }
+
+        def blink(i):
+            return {'patient_id': owner(), 'blink_count': rng.randint(0, 20), 'duration': 30.0, 'created_at': when()}
+
+        def typing(i):
+            return {
+                'patient_id': owner(), 'wpm': rng.randint(10, 80), 'accuracy': rng.randint(60, 100),
+                'test_text': 'benchmark', 'risk_score': rng.randint(0, 100), 'backspace_count': rng.randint(0, 30),
+                'pause_count': rng.randint(0, 5), 'hesitation_count': rng.randint(0, 10),
+                'avg_key_delay': rng.randint(100, 900), 'created_at': when()
+            }
+
+        timings = {}
+        for name, model, fn, count in (('patient', web.Patient, patient, patients), ('scan', web.Scan, scan, rows),
+                                       ('blink_result', web.BlinkResult, blink, rows),
+                                       ('typing_result', web.TypingResult, typing, rows)):
+            started = time.perf_counter()
+            for batch in _batches(fn, count):
+                db.session.execute(db.insert(model), batch)
+                db.session.commit()
+            timings[name] = round(time.perf_counter() - started, 2)
+            print(f'{name}: {count} rows in {timings[name]}s', file=sys.stderr)
+
+        if not web.Admin.query.filter(db.func.lower(web.Admin.email) == ADMIN_EMAIL).first():
+            db.session.add(web.Admin(email=ADMIN_EMAIL, password=password_hash))
+            db.session.commit()
+
+        started = time.perf_counter()
+        web.rebuild_patient_summaries()
+        timings['patient_summary'] = round(time.perf_counter() - started, 2)
+
+    return {
+        'database': web.app.config['SQLALCHEMY_DATABASE_URI'],
+        'rows': rows,
+        'patients': patients,
+        'first_patient_id': first_id,
+        'password': PASSWORD,
+        'admin_email': ADMIN_EMAIL,
+        'seed': seed_value,
+        'seconds': timings
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help='SQLite file to seed (created if missing)')
+    parser.add_argument('--rows', type=int, default=1000, help='rows per result table')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--manifest', default=None, help='where to write the manifest (default: next to the database)')
+    args = parser.parse_args()
+
+    # the app reads its configuration at import; models are never needed for seeding
+    db_path = os.path.abspath(args.db)
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    os.environ.setdefault('MODEL_LOADING', 'lazy')
+
+    manifest = seed(args.rows, args.seed)
+    path = args.manifest or db_path + '.json'
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    print(f'Manifest written to {path}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,35 +1,122 @@
 import cv2
+import math
 import mediapipe as mp
 import numpy as np
 import time
 import threading
 import base64
 
+from ear_series import EarRingBuffer, encode as encode_ear_series
+
+
+def create_face_mesh():
+    return mp.solutions.face_mesh.FaceMesh(
+        max_num_faces=1,
+        refine_landmarks=True,
+        min_detection_confidence=0.5,
+        min_tracking_confidence=0.5
+    )
+
+
+def decode_client_frame(data, content_type, width=None, height=None):
+    """Decode a frame posted by the browser: JPEG/PNG bytes, or raw 8-bit grayscale of width x height."""
+    if content_type and content_type.startswith('application/octet-stream'):
+        if not width or not height or len(data) != width * height:
+            raise ValueError('Raw grayscale frames need width and height matching the body size')
+        gray = np.frombuffer(data, dtype=np.uint8).reshape(height, width)
+        return cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+    if frame is None:
+        raise ValueError('Could not decode frame')
+    return frame
+
+
 class BlinkDetector:
-    def __init__(self):
-        self.mp_face_mesh = mp.solutions.face_mesh
-        self.face_mesh = self.mp_face_mesh.FaceMesh(
-            max_num_faces=1,
-            refine_landmarks=True,
-            min_detection_confidence=0.5,
-            min_tracking_confidence=0.5
-        )
+    def __init__(self, face_mesh=None, duration=30, preview_quality=70, preview_fps=10,
+                 overlays=True, process_width=None, crop_roi=False, stage_timer=None):
+        self.face_mesh = face_mesh if face_mesh is not None else create_face_mesh()
         
         self.LEFT_EYE = [33, 160, 158, 133, 153, 144]
         self.RIGHT_EYE = [362, 385, 387, 263, 373, 380]
+
+        # per-frame buffers, reused so the landmark -> EAR path allocates nothing
+        self.eye_landmarks = self.LEFT_EYE + self.RIGHT_EYE
+        self._points = np.empty((12, 2), dtype=np.float64)
+        self._scale = np.empty(2, dtype=np.float64)
+        self._offset = np.empty(2, dtype=np.float64)
+        self._upper_idx = np.array([1, 2, 0, 7, 8, 6])
+        self._lower_idx = np.array([5, 4, 3, 11, 10, 9])
+        self._upper = np.empty((6, 2), dtype=np.float64)
+        self._lower = np.empty((6, 2), dtype=np.float64)
+        self._dist = np.empty(6, dtype=np.float64)
+        self._ears = np.empty(2, dtype=np.float64)
+
+        # overlays annotate the preview; process_width downscales and crop_roi
+        # crops around the last detected eyes before FaceMesh
+        self.overlays = overlays
+        self.process_width = process_width or None
+        self.crop_roi = crop_roi
+        self.roi = None
+
+        # optional histogram with a single 'stage' label, observed once per frame
+        self.stage_timer = stage_timer
         
         self.EAR_THRESHOLD = 0.20
+        # CLOSED_FRAMES is calibrated for a camera running at NOMINAL_FPS
         self.CLOSED_FRAMES = 2
+        self.NOMINAL_FPS = 30.0
+
+        # per-frame (time, left EAR, right EAR), kept so stored sessions can be re-scored
+        self.ear_buffer = EarRingBuffer(capacity=int(duration * self.NOMINAL_FPS * 2))
         
         self.closed_counter = 0
+        self.closed_since = None
         self.blink_total = 0
+        self.blink_times = []
         self.start_time = None
-        self.duration = 30
+        self.duration = duration
         self.running = False
         self.cap = None
+        self.thread = None
         self.current_frame = None
         self.frame_lock = threading.Lock()
+
+        # client-streamed frames: a single pending slot, newer frames replace unprocessed ones
+        self.pending = None
+        self.pending_ready = threading.Condition()
+        self.last_frame_at = None
+        self.frame_interval = None
+        self.process_seconds = None
+        self.frames_received = 0
+        self.frames_dropped = 0
+
+        # live preview: each frame is JPEG-encoded at most once, only while someone watches
+        self.preview_quality = int(preview_quality)
+        self.preview_interval = 1.0 / preview_fps if preview_fps else 0.0
+        self.preview_cond = threading.Condition()
+        self.preview_jpeg = None
+        self.preview_seq = 0
+        self.preview_viewers = 0
+        self.last_preview_at = 0.0
         
+    def warmup(self):
+        """Run FaceMesh once on a blank frame so the first real frame is not slow."""
+        self.face_mesh.process(np.zeros((480, 640, 3), dtype=np.uint8))
+
+    def eye_aspect_ratios(self, points):
+        """EAR of both eyes from a (12, 2) array of LEFT_EYE + RIGHT_EYE points, in one pass."""
+        np.take(points, self._upper_idx, axis=0, out=self._upper)
+        np.take(points, self._lower_idx, axis=0, out=self._lower)
+        np.subtract(self._upper, self._lower, out=self._upper)
+        np.square(self._upper, out=self._upper)
+        np.sum(self._upper, axis=1, out=self._dist)
+        np.sqrt(self._dist, out=self._dist)
+        d = self._dist.reshape(2, 3)
+        np.add(d[:, 0], d[:, 1], out=self._ears)
+        np.divide(self._ears, d[:, 2], out=self._ears)
+        self._ears *= 0.5
+        return self._ears
+
     def euclidean(self, p1, p2):
         return np.linalg.norm(np.array(p1) - np.array(p2))
     
@@ -39,24 +126,49 @@ class BlinkDetector:
         C = self.euclidean(eye[0], eye[3])
         return (A + B) / (2.0 * C)
     
-    def start(self):
-
+    def start(self, camera=True):
+        """Start a test reading the server camera, or (camera=False) frames passed to submit_frame()."""
         if self.running:
             return False
-            
-        self.cap = cv2.VideoCapture(0)
-        if not self.cap.isOpened():
-            return False
+
+        if camera:
+            self.cap = cv2.VideoCapture(0)
+            if not self.cap.isOpened():
+                return False
             
         self.running = True
         self.blink_total = 0
+        self.blink_times = []
         self.closed_counter = 0
+        self.last_frame_at = None
+        self.frame_interval = None
+        self.roi = None
+        self.ear_buffer.clear()
         self.start_time = time.time()
 
-        self.thread = threading.Thread(target=self._detection_loop, daemon=True)
+        loop = self._detection_loop if camera else self._stream_loop
+        self.thread = threading.Thread(target=loop, daemon=True)
         self.thread.start()
         
         return True
+
+    def submit_frame(self, frame, timestamp=None):
+        """Queue a client frame for processing; returns False once the test is over."""
+        if not self.running:
+            return False
+        with self.pending_ready:
+            self.frames_received += 1
+            if self.pending is not None:
+                self.frames_dropped += 1
+            self.pending = (frame, time.time() if timestamp is None else timestamp)
+            self.pending_ready.notify()
+        return True
+
+    def suggested_interval(self, min_interval=1 / 30.0, max_interval=0.1):
+        """Seconds the client should wait between frames so processing keeps up."""
+        if self.process_seconds is None:
+            return min_interval
+        return min(max_interval, max(min_interval, self.process_seconds * 1.2))
     
     def _detection_loop(self):
         while self.running:
@@ -68,55 +180,178 @@ class BlinkDetector:
                 self.running = False
                 break
 
+            self.process_frame(frame, time.time())
+
+    def _stream_loop(self):
+        while self.running:
+            if time.time() - self.start_time > self.duration:
+                self.running = False
+                break
+
+            with self.pending_ready:
+                if self.pending is None:
+                    self.pending_ready.wait(timeout=0.5)
+                item, self.pending = self.pending, None
+            if item is None:
+                continue
+
+            started = time.perf_counter()
+            self.process_frame(*item)
+            elapsed = time.perf_counter() - started
+            self.process_seconds = elapsed if self.process_seconds is None else 0.8 * self.process_seconds + 0.2 * elapsed
+
+    def required_closed_frames(self):
+        """CLOSED_FRAMES scaled to the observed frame rate, so a blink is the same duration at any rate."""
+        if not self.frame_interval:
+            return self.CLOSED_FRAMES
+        frames = math.ceil(self.CLOSED_FRAMES / (self.NOMINAL_FPS * self.frame_interval) - 1e-6)
+        return max(1, min(self.CLOSED_FRAMES, frames))
+
+    def process_frame(self, frame, timestamp=None, draw=None, preview=True):
+        """Run FaceMesh on a BGR frame and update the blink count.
+
+        Returns (left_ear, right_ear), or None when no face was found. The
+        mirrored frame becomes the preview; draw (default: the overlays
+        setting) only decides whether the eye landmarks are drawn on it.
+        preview=False, for offline analysis, skips the preview altogether.
+        """
+        if timestamp is not None:
+            if self.last_frame_at is not None and timestamp > self.last_frame_at:
+                interval = timestamp - self.last_frame_at
+                self.frame_interval = interval if self.frame_interval is None else 0.8 * self.frame_interval + 0.2 * interval
+            self.last_frame_at = timestamp
+
+        if draw is None:
+            draw = self.overlays
+        draw = draw and preview
+        started = time.perf_counter()
+        if preview:
             frame = cv2.flip(frame, 1)
-            h, w, _ = frame.shape
-            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = self.face_mesh.process(rgb)
-            
-            if results.multi_face_landmarks:
-                lm = results.multi_face_landmarks[0].landmark
-                
-                left_eye = [(int(lm[i].x * w), int(lm[i].y * h)) for i in self.LEFT_EYE]
-                right_eye = [(int(lm[i].x * w), int(lm[i].y * h)) for i in self.RIGHT_EYE]
-
-                for point in left_eye:
-                    cv2.circle(frame, point, 2, (0, 255, 0), -1)
-                for point in right_eye:
-                    cv2.circle(frame, point, 2, (0, 255, 0), -1)
-                
-                for i in range(len(left_eye)):
-                    next_i = (i + 1) % len(left_eye)
-                    cv2.line(frame, left_eye[i], left_eye[next_i], (255, 0, 0), 1)
-                
-                for i in range(len(right_eye)):
-                    next_i = (i + 1) % len(right_eye)
-                    cv2.line(frame, right_eye[i], right_eye[next_i], (255, 0, 0), 1)
-                
-                left_ear = self.eye_aspect_ratio(left_eye)
-                right_ear = self.eye_aspect_ratio(right_eye)
-                                
-                if left_ear < self.EAR_THRESHOLD and right_ear < self.EAR_THRESHOLD:
-                    self.closed_counter += 1
-
-                else:
-                    if self.closed_counter >= self.CLOSED_FRAMES:
-                        self.blink_total += 1
-                    self.closed_counter = 0
-            
+        rgb, (x0, y0, roi_w, roi_h) = self._facemesh_input(frame)
+        prepared = time.perf_counter()
+        results = self.face_mesh.process(rgb)
+        meshed = time.perf_counter()
+        ears = None
+        
+        if results.multi_face_landmarks:
+            lm = results.multi_face_landmarks[0].landmark
+            points = self._points
+            for k, i in enumerate(self.eye_landmarks):
+                point = lm[i]
+                points[k, 0] = point.x
+                points[k, 1] = point.y
+            self._scale[0], self._scale[1] = roi_w, roi_h
+            self._offset[0], self._offset[1] = x0, y0
+            np.multiply(points, self._scale, out=points)
+            np.add(points, self._offset, out=points)
+
+            if draw:
+                eyes = points.astype(np.int32).reshape(2, 6, 2)
+                for point in eyes.reshape(12, 2):
+                    cv2.circle(frame, (int(point[0]), int(point[1])), 2, (0, 255, 0), -1)
+                cv2.polylines(frame, list(eyes), True, (255, 0, 0), 1)
+
+            left_ear, right_ear = self.eye_aspect_ratios(points)
+            left_ear, right_ear = float(left_ear), float(right_ear)
+            self.update_blinks(left_ear, right_ear, timestamp)
+            ears = (left_ear, right_ear)
+            if self.crop_roi:
+                self._update_roi(frame.shape, points)
+        else:
+            self.roi = None
+            left_ear = right_ear = np.nan
+        self.ear_buffer.append(time.time() if timestamp is None else timestamp, left_ear, right_ear)
+        
+        analysed = time.perf_counter()
+        if preview:
             with self.frame_lock:
-                self.current_frame = frame.copy()
+                self.current_frame = frame
+            self._publish_preview(frame)
+
+        if self.stage_timer is not None:
+            finished = time.perf_counter()
+            observe = self.stage_timer.observe
+            observe(prepared - started, 'preprocess')
+            observe(meshed - prepared, 'facemesh')
+            observe(analysed - meshed, 'landmarks')
+            observe(finished - analysed, 'preview')
+            observe(finished - started, 'frame')
+        return ears
+
+    def _facemesh_input(self, frame):
+        """RGB image for FaceMesh (ROI-cropped and downscaled as configured) and its (x, y, w, h) in frame."""
+        h, w = frame.shape[:2]
+        x0, y0, x1, y1 = self.roi if self.crop_roi and self.roi else (0, 0, w, h)
+        view = frame[y0:y1, x0:x1]
+        if self.process_width and view.shape[1] > self.process_width:
+            height = max(1, round(view.shape[0] * self.process_width / view.shape[1]))
+            view = cv2.resize(view, (self.process_width, height), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(view, cv2.COLOR_BGR2RGB), (x0, y0, x1 - x0, y1 - y0)
+
+    def _update_roi(self, shape, points):
+        # a square 3x the outer eye-corner distance, centred on the eyes, covers the face
+        h, w = shape[:2]
+        left, right = points[0], points[9]
+        cx, cy = (left[0] + right[0]) / 2, (left[1] + right[1]) / 2
+        half = 1.5 * float(np.hypot(right[0] - left[0], right[1] - left[1]))
+        x0, y0 = max(0, int(cx - half)), max(0, int(cy - half))
+        x1, y1 = min(w, int(cx + half)), min(h, int(cy + half))
+        self.roi = (x0, y0, x1, y1) if x1 - x0 > 32 and y1 - y0 > 32 else None
+
+    def _publish_preview(self, frame):
+        now = time.monotonic()
+        if not self.preview_viewers or now - self.last_preview_at < self.preview_interval:
+            return
+        ok, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.preview_quality])
+        if not ok:
+            return
+        self.last_preview_at = now
+        with self.preview_cond:
+            self.preview_jpeg = buffer.tobytes()
+            self.preview_seq += 1
+            self.preview_cond.notify_all()
+
+    def preview_frames(self):
+        """Yield each new preview JPEG as it is published; ends once the test stops."""
+        with self.preview_cond:
+            self.preview_viewers += 1
+        try:
+            seen = 0
+            while True:
+                with self.preview_cond:
+                    if self.preview_seq == seen:
+                        self.preview_cond.wait(timeout=1.0)
+                    if self.preview_seq == seen:
+                        if not self.running:
+                            return
+                        continue
+                    seen, jpeg = self.preview_seq, self.preview_jpeg
+                yield jpeg
+        finally:
+            with self.preview_cond:
+                self.preview_viewers -= 1
+
+    def update_blinks(self, left_ear, right_ear, timestamp=None):
+        if left_ear < self.EAR_THRESHOLD and right_ear < self.EAR_THRESHOLD:
+            if self.closed_counter == 0:
+                self.closed_since = timestamp
+            self.closed_counter += 1
+
+        else:
+            if self.closed_counter >= self.required_closed_frames():
+                self.blink_total += 1
+                self.blink_times.append(self.closed_since)
+            self.closed_counter = 0
     
     def get_current_frame_base64(self):
         
+        # process_frame never mutates a stored frame, so encode outside the lock
         with self.frame_lock:
-            if self.current_frame is None:
-
-                blank = np.zeros((480, 640, 3), dtype=np.uint8)
-                _, buffer = cv2.imencode('.jpg', blank)
-                return base64.b64encode(buffer).decode('utf-8')
-            
-            _, buffer = cv2.imencode('.jpg', self.current_frame)
-            return base64.b64encode(buffer).decode('utf-8')
+            frame = self.current_frame
+        if frame is None:
+            frame = np.zeros((480, 640, 3), dtype=np.uint8)
+        _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.preview_quality])
+        return base64.b64encode(buffer).decode('utf-8')
     
     def get_stats(self):
 
@@ -134,16 +369,30 @@ class BlinkDetector:
         return {
             'blink_count': self.blink_total,
             'time_remaining': time_remaining,
-            'completed': completed
+            'completed': completed,
+            'frames_received': self.frames_received,
+            'frames_dropped': self.frames_dropped
         }
     
     def stop(self):
 
         self.running = False
+        with self.pending_ready:
+            self.pending_ready.notify()
+        with self.preview_cond:
+            self.preview_cond.notify_all()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=2)
         if self.cap is not None:
             self.cap.release()
         self.cap = None
     
+    def ear_series(self):
+        """The session's EAR series in ear_series' compact encoding, or None if nothing was recorded."""
+        if not len(self.ear_buffer):
+            return None
+        return encode_ear_series(*self.ear_buffer.samples())
+
     def get_final_results(self):
         
         blink_count = self.blink_total
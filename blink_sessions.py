@@ -0,0 +1,143 @@
+import queue
+import threading
+import time
+import uuid
+
+
+class SessionLimitReached(Exception):
+    pass
+
+
+class FaceMeshPool:
+    """A bounded set of reusable FaceMesh graphs.
+
+    Instances are built on demand up to size and handed back with release(),
+    so building the mediapipe graph is paid once per slot, not per test.
+    """
+
+    def __init__(self, factory, size=8):
+        self.factory = factory
+        self.size = max(1, int(size))
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def prewarm(self, count=1):
+        for _ in range(min(count, self.size)):
+            mesh = self.acquire()
+            self.release(mesh)
+
+    def acquire(self):
+        """Return an idle FaceMesh, or None if every slot is in use."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created >= self.size:
+                return None
+            self._created += 1
+        try:
+            return self.factory()
+        except Exception:
+            with self._lock:
+                self._created -= 1
+            raise
+
+    def release(self, mesh):
+        self._idle.put(mesh)
+
+    def in_use(self):
+        return self._created - self._idle.qsize()
+
+
+class BlinkSessionManager:
+    """Runs many blink tests at once, each with its own detector state.
+
+    Every session leases one FaceMesh from the pool for its lifetime; when
+    the pool is exhausted new sessions are refused (admission control).
+    Sessions are closed by stop, or by the reaper once they are older than
+    session_timeout seconds. A closed session's EAR series is kept for
+    another session_timeout so it can be saved with the result.
+    """
+
+    def __init__(self, detector_factory, face_mesh_factory, pool_size=8, session_timeout=120, duration=30):
+        self.detector_factory = detector_factory
+        self.pool = FaceMeshPool(face_mesh_factory, pool_size)
+        self.session_timeout = float(session_timeout)
+        self.duration = duration
+        self._sessions = {}
+        self._finished = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+        self.rejected = 0
+
+    def _ensure_reaper(self):
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._reaper = threading.Thread(target=self._reap_loop, name='blink-session-reaper', daemon=True)
+        self._reaper.start()
+
+    def create(self):
+        """Start a new session; returns (session_id, detector)."""
+        self._ensure_reaper()
+        mesh = self.pool.acquire()
+        if mesh is None:
+            with self._lock:
+                self.rejected += 1
+            raise SessionLimitReached('All blink detection slots are busy, try again shortly')
+        detector = self.detector_factory(face_mesh=mesh, duration=self.duration)
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[session_id] = {'detector': detector, 'mesh': mesh, 'created_at': time.time()}
+        return session_id, detector
+
+    def get(self, session_id):
+        """Detector for a session; raises KeyError for unknown or expired ids."""
+        with self._lock:
+            return self._sessions[session_id]['detector']
+
+    def close(self, session_id):
+        """Stop a session and return its FaceMesh to the pool; returns the detector or None."""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return None
+        session['detector'].stop()
+        self.pool.release(session['mesh'])
+        series = session['detector'].ear_series()
+        if series is not None:
+            with self._lock:
+                self._finished[session_id] = (time.time(), series)
+        return session['detector']
+
+    def take_series(self, session_id):
+        """Pop the encoded EAR series of a closed session, or None."""
+        with self._lock:
+            entry = self._finished.pop(session_id, None)
+        return entry[1] if entry else None
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(5)
+            cutoff = time.time() - self.session_timeout
+            with self._lock:
+                expired = [sid for sid, s in self._sessions.items() if s['created_at'] < cutoff]
+                for sid in [sid for sid, (closed_at, _) in self._finished.items() if closed_at < cutoff]:
+                    del self._finished[sid]
+            for sid in expired:
+                self.close(sid)
+
+    def stats(self):
+        with self._lock:
+            active = len(self._sessions)
+            intervals = [s['detector'].frame_interval for s in self._sessions.values()]
+        rates = [1.0 / i for i in intervals if i]
+        return {
+            'active_sessions': active,
+            'mean_fps': round(sum(rates) / len(rates), 1) if rates else None,
+            'capacity': self.pool.size,
+            'face_meshes_built': self.pool._created,
+            'rejected': self.rejected,
+            'session_timeout': self.session_timeout
+        }
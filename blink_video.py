@@ -0,0 +1,144 @@
+"""Offline blink analysis of recorded videos.
+
+Runs the BlinkDetector EAR/blink-counting logic over a video file without
+drawing overlays. Frames are decoded on a separate thread and handed to
+FaceMesh through a bounded queue, so decoding overlaps with inference.
+
+  python blink_video.py session.mp4 [--stride 2] [--width 480] [--out result.json]
+"""
+import argparse
+import json
+import queue
+import sys
+import threading
+import time
+
+import cv2
+
+from blink_model import BlinkDetector
+
+_END = object()
+
+
+def _put(frames, item, stop):
+    while not stop.is_set():
+        try:
+            frames.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+
+def _decode_frames(cap, stride, width, frames, stop):
+    index = 0
+    try:
+        while not stop.is_set():
+            if index % stride:
+                # skipped frames are grabbed but never retrieved or colour-converted
+                ok = cap.grab()
+            else:
+                ok, frame = cap.read()
+                if ok:
+                    if width and frame.shape[1] > width:
+                        height = round(frame.shape[0] * width / frame.shape[1])
+                        frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+                    _put(frames, (index, frame), stop)
+            if not ok:
+                break
+            index += 1
+    except Exception as e:
+        _put(frames, e, stop)
+    finally:
+        _put(frames, (_END, index), stop)
+
+
+def analyze_video(path, stride=1, width=None, face_mesh=None, queue_size=32):
+    """Count blinks in a video file.
+
+    stride processes every n-th frame; width downscales frames wider than
+    it before FaceMesh. Blink counting adapts to the effective frame rate.
+    Returns counts, blink timestamps (seconds), per-frame mean EAR (None
+    where no face was found) and processing throughput. A face_mesh passed
+    in is left open for the caller; one built here is closed on return.
+    """
+    stride = max(1, int(stride))
+    cap = cv2.VideoCapture(path)
+    if not cap.isOpened():
+        raise ValueError(f'Could not open video: {path}')
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    # a FaceMesh built here holds native graph resources until closed
+    owns_face_mesh = face_mesh is None
+    detector = BlinkDetector(face_mesh=face_mesh)
+    frames = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    reader = threading.Thread(target=_decode_frames, args=(cap, stride, width, frames, stop),
+                              name='video-decoder', daemon=True)
+
+    times, ears = [], []
+    total_frames = 0
+    started = time.perf_counter()
+    reader.start()
+    try:
+        while True:
+            item = frames.get()
+            if isinstance(item, Exception):
+                raise item
+            index, frame = item
+            if index is _END:
+                total_frames = frame
+                break
+            t = index / fps
+            result = detector.process_frame(frame, t, preview=False)
+            times.append(round(t, 3))
+            ears.append(None if result is None else round((result[0] + result[1]) / 2, 4))
+    finally:
+        stop.set()
+        reader.join()
+        cap.release()
+        if owns_face_mesh:
+            detector.face_mesh.close()
+    elapsed = time.perf_counter() - started
+
+    duration = total_frames / fps
+    return {
+        'blink_count': detector.blink_total,
+        'blink_times': [round(t, 3) for t in detector.blink_times],
+        'blinks_per_minute': round(detector.blink_total * 60 / duration, 2) if duration else None,
+        'duration_seconds': round(duration, 3),
+        'video_fps': round(fps, 3),
+        'stride': stride,
+        'width': width,
+        'frames_total': total_frames,
+        'frames_processed': len(times),
+        'elapsed_seconds': round(elapsed, 3),
+        'processing_fps': round(len(times) / elapsed, 1) if elapsed else None,
+        'ear': {'time': times, 'value': ears}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('videos', nargs='+')
+    parser.add_argument('--stride', type=int, default=1, help='process every n-th frame')
+    parser.add_argument('--width', type=int, default=None, help='downscale frames wider than this')
+    parser.add_argument('--out', default=None, help='write results as JSON (one object per video)')
+    parser.add_argument('--no-ear', action='store_true', help='omit the per-frame EAR series')
+    args = parser.parse_args()
+
+    results = {}
+    for path in args.videos:
+        result = analyze_video(path, stride=args.stride, width=args.width)
+        if args.no_ear:
+            del result['ear']
+        results[path] = result
+        print(f"{path}: {result['blink_count']} blinks in {result['duration_seconds']}s, "
+              f"{result['frames_processed']} frames at {result['processing_fps']} frames/sec", file=sys.stderr)
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f)
+
+
+if __name__ == '__main__':
+    main()
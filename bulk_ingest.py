@@ -0,0 +1,85 @@
+import os
+import shutil
+import tarfile
+import tempfile
+import zipfile
+import zlib
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff', '.webp'}
+ZIP_MIMETYPES = {'application/zip', 'application/x-zip-compressed'}
+# raised while listing or reading a corrupt, truncated or non-archive upload
+ARCHIVE_ERRORS = (zipfile.BadZipFile, tarfile.TarError, EOFError, zlib.error)
+
+
+class ArchiveTooLarge(Exception):
+    pass
+
+
+class CappedReader:
+    """File-like wrapper that raises ArchiveTooLarge once more than limit bytes are read."""
+
+    def __init__(self, stream, limit):
+        self.stream = stream
+        self.limit = limit
+        self.read_bytes = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.read_bytes += len(data)
+        if self.read_bytes > self.limit:
+            raise ArchiveTooLarge(f'Archive exceeds {self.limit} bytes')
+        return data
+
+
+def is_image_name(name):
+    base = os.path.basename(name)
+    if not base or base.startswith('.') or '__MACOSX' in name:
+        return False
+    return os.path.splitext(base)[1].lower() in IMAGE_EXTENSIONS
+
+
+def is_zip(filename, mimetype):
+    return (filename or '').lower().endswith('.zip') or mimetype in ZIP_MIMETYPES
+
+
+def iter_tar_images(stream):
+    """Yield (name, fileobj) for image members of a tar stream, read sequentially.
+
+    Uses tarfile's streaming mode, so the archive never has to be seekable
+    or held in memory; each fileobj must be consumed before the next one.
+    Compressed tars (gz/bz2/xz) are detected automatically.
+    """
+    with tarfile.open(fileobj=stream, mode='r|*') as tf:
+        for member in tf:
+            if member.isfile() and is_image_name(member.name):
+                yield member.name, tf.extractfile(member)
+
+
+def iter_zip_images(fileobj):
+    """Yield (name, fileobj) for image members of a seekable zip file."""
+    with zipfile.ZipFile(fileobj) as zf:
+        for info in zf.infolist():
+            if not info.is_dir() and is_image_name(info.filename):
+                with zf.open(info) as member:
+                    yield info.filename, member
+
+
+def iter_archive_images(stream, filename, mimetype, spool_dir, chunk_size=64 * 1024):
+    """Yield (name, fileobj) for every image in a zip or tar archive stream.
+
+    Zip needs random access to its central directory, so a non-seekable zip
+    stream is first spooled to a temporary file in spool_dir in chunks.
+    """
+    if not is_zip(filename, mimetype):
+        yield from iter_tar_images(stream)
+        return
+
+    seekable = getattr(stream, 'seekable', lambda: False)()
+    if seekable:
+        yield from iter_zip_images(stream)
+        return
+
+    with tempfile.TemporaryFile(dir=spool_dir) as spool:
+        shutil.copyfileobj(stream, spool, chunk_size)
+        spool.seek(0)
+        yield from iter_zip_images(spool)
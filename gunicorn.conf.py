@@ -0,0 +1,86 @@
+"""gunicorn configuration: the production entry point.
+
+  gunicorn -c gunicorn.conf.py app:app
+
+The master preloads the app with the scan model loaded, applies pending
+migrations once and forks the workers, which share the model weights with
+it copy-on-write. Each worker limits torch to its share of the cores and
+warms up the scan model and the blink detector in post_fork, before it
+accepts connections. On SIGTERM, workers get graceful_timeout seconds to
+finish in-flight requests and background jobs.
+
+Blink test sessions and background jobs (/predict_async, /analyze_blink_video)
+live in the memory of the worker that started them, so their follow-up
+requests (/blink_frame, /blink_preview, /blink_events, /stop_blink_detection,
+/jobs/<id>) must reach that same worker. The server therefore runs a single
+worker unless STICKY_ROUTING=1 says the load balancer pins each client to one
+worker. Every blink test holds two streams (preview and events) open on a
+request thread for its whole duration, so the default thread count leaves
+room for BLINK_MAX_SESSIONS tests on top of ordinary traffic.
+
+Environment: BIND (0.0.0.0:8000), WEB_CONCURRENCY (workers; more than one
+needs STICKY_ROUTING=1), GUNICORN_THREADS (request threads per worker),
+TORCH_THREADS (default: cores / workers).
+"""
+import gc
+import os
+import shutil
+import time
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+sticky_routing = os.environ.get('STICKY_ROUTING', '0') == '1'
+workers = int(os.environ.get('WEB_CONCURRENCY', max(1, min(4, os.cpu_count() or 1)) if sticky_routing else 1))
+if workers > 1 and not sticky_routing:
+    raise SystemExit('WEB_CONCURRENCY > 1 needs STICKY_ROUTING=1: blink sessions and jobs live in one worker')
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 2 * int(os.environ.get('BLINK_MAX_SESSIONS', 32)) + 8))
+preload_app = True
+# post_fork warmup (model passes, FaceMesh) runs before a worker's first heartbeat
+timeout = 120
+graceful_timeout = 30
+torch_threads = int(os.environ.get('TORCH_THREADS', max(1, (os.cpu_count() or 1) // workers)))
+
+# read by the app at import: the master loads the weights, OpenMP/MKL get the per-worker budget
+os.environ['SERVE_WORKERS'] = str(workers)
+os.environ['MODEL_LOADING'] = 'eager'
+for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(var, str(torch_threads))
+if int(os.environ.get('INFERENCE_WORKERS', 0)):
+    raise SystemExit('INFERENCE_WORKERS must be 0 under gunicorn: the workers already run inference in-process')
+
+
+def on_starting(server):
+    import app as web
+
+    if not web.scan_model.ready:
+        raise SystemExit(f'Scan model failed to load: {web.scan_model.error}')
+    with web.app.app_context():
+        applied = web.run_migrations(web.db, web.upload_store, web.rebuild_patient_summaries)
+    server.log.info(f"Applied migrations: {applied}" if applied else "Schema is up to date")
+    # no pooled connection may cross the fork
+    web.db.engine.dispose()
+    shutil.rmtree(os.path.join(web.app.instance_path, 'metrics'), ignore_errors=True)
+
+
+def when_ready(server):
+    # objects alive now outlive the workers; keeping them out of the collector's
+    # reach stops it from touching (and so copying) their pages in every worker
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app as web
+
+    web.init_worker(worker.age, torch_threads)
+
+
+def worker_exit(server, worker):
+    import app as web
+
+    deadline = time.monotonic() + graceful_timeout
+    for jobs in (web.scan_jobs, web.video_jobs):
+        while time.monotonic() < deadline:
+            stats = jobs.stats()
+            if not stats['queued'] and not stats['running']:
+                break
+            time.sleep(0.1)
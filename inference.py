@@ -0,0 +1,85 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+def classify_batch(model, images):
+    """Run one batched forward pass and return (class, confidence) per image."""
+    results = model.predict(source=list(images), verbose=False)
+    out = []
+    for r in results:
+        probs = r.probs
+        out.append((r.names[probs.top1], float(probs.top1conf)))
+    return out
+
+
+class BatchingPredictor:
+    """Collects concurrent predict calls into micro-batches.
+
+    Callers block in predict() while a dispatcher thread gathers up to
+    max_batch_size images or waits at most max_wait_ms after the first one,
+    then runs predict_fn on the whole batch and hands each caller its result.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=8, max_wait_ms=10, concurrency=1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0, float(max_wait_ms)) / 1000.0
+        self.concurrency = max(1, int(concurrency))
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.concurrency):
+                t = threading.Thread(target=self._dispatch_loop, name=f'predict-batcher-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, image):
+        self._ensure_started()
+        fut = Future()
+        self._queue.put((image, fut))
+        return fut
+
+    def predict(self, image, timeout=None):
+        """Classify a single image; returns (class, confidence)."""
+        return self.submit(image).result(timeout=timeout)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch_loop(self):
+        while True:
+            batch = self._collect()
+            batch = [(img, fut) for img, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.predict_fn([img for img, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), res in zip(batch, results):
+                fut.set_result(res)
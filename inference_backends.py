@@ -0,0 +1,235 @@
+"""Selectable CPU inference backends for the scan classifier.
+
+  eager             ultralytics YOLO predict pipeline (reference)
+  torchscript       fused, traced and frozen TorchScript graph
+  torchscript-int8  as above with dynamic int8 quantization of Linear layers
+
+Compiled artifacts are cached on disk, keyed by the model's fingerprint.
+
+Command line:
+  python inference_backends.py export --backend torchscript-int8
+  python inference_backends.py evaluate --holdout data/holdout
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from inference import classify_batch
+from prediction_cache import file_fingerprint
+
+BACKENDS = ('eager', 'torchscript', 'torchscript-int8')
+
+
+class EagerBackend:
+    name = 'eager'
+
+    def __init__(self, model_path):
+        from ultralytics import YOLO
+        self.yolo = YOLO(model_path)
+        self.names = self.yolo.names
+
+    def predict_batch(self, images):
+        return classify_batch(self.yolo, images)
+
+    def warmup(self, runs=2):
+        blank = np.zeros((224, 224, 3), dtype=np.uint8)
+        for _ in range(runs):
+            self.predict_batch([blank])
+
+
+class TorchScriptBackend:
+    """Runs an exported TorchScript classifier with numpy preprocessing.
+
+    Preprocessing mirrors ultralytics' classify transforms: resize the
+    shorter side to imgsz, centre crop, scale to [0, 1], CHW RGB.
+    """
+
+    def __init__(self, model_path, quantize=False, cache_dir=None):
+        import torch
+        self.torch = torch
+        self.name = 'torchscript-int8' if quantize else 'torchscript'
+        cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(model_path)), '.model_cache')
+        os.makedirs(cache_dir, exist_ok=True)
+        stem = os.path.splitext(os.path.basename(model_path))[0]
+        self.artifact_path = os.path.join(
+            cache_dir, f'{stem}-{file_fingerprint(model_path)[:12]}-{self.name}.ts'
+        )
+        if not os.path.exists(self.artifact_path):
+            export_torchscript(model_path, self.artifact_path, quantize=quantize)
+
+        extra = {'meta.json': ''}
+        self.module = torch.jit.load(self.artifact_path, map_location='cpu', _extra_files=extra)
+        meta = json.loads(extra['meta.json'])
+        self.imgsz = meta['imgsz']
+        self.names = {int(k): v for k, v in meta['names'].items()}
+
+    def _preprocess(self, img):
+        if isinstance(img, np.ndarray):
+            img = Image.fromarray(np.ascontiguousarray(img[:, :, ::-1]))
+        img = img.convert('RGB')
+        w, h = img.size
+        scale = self.imgsz / min(w, h)
+        img = img.resize((max(self.imgsz, round(w * scale)), max(self.imgsz, round(h * scale))), Image.BILINEAR)
+        w, h = img.size
+        left, top = (w - self.imgsz) // 2, (h - self.imgsz) // 2
+        img = img.crop((left, top, left + self.imgsz, top + self.imgsz))
+        return np.asarray(img, dtype=np.float32).transpose(2, 0, 1) / 255.0
+
+    def predict_batch(self, images):
+        batch = self.torch.from_numpy(np.stack([self._preprocess(img) for img in images]))
+        with self.torch.inference_mode():
+            probs = self.module(batch)
+        conf, top1 = probs.max(dim=1)
+        return [(self.names[int(i)], float(c)) for i, c in zip(top1, conf)]
+
+    def warmup(self, runs=2):
+        blank = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        for _ in range(runs):
+            self.predict_batch([blank])
+
+
+def export_torchscript(model_path, artifact_path, quantize=False):
+    """Fuse, optionally int8-quantize, trace and freeze the classifier to artifact_path."""
+    import torch
+    from ultralytics import YOLO
+
+    yolo = YOLO(model_path)
+    net = yolo.model.float().eval()
+    net.fuse()
+    imgsz = net.args.get('imgsz', 224) if isinstance(getattr(net, 'args', None), dict) else 224
+    if isinstance(imgsz, (list, tuple)):
+        imgsz = imgsz[0]
+
+    class ProbsOnly(torch.nn.Module):
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, x):
+            y = self.inner(x)
+            return y[0] if isinstance(y, (tuple, list)) else y
+
+    wrapped = ProbsOnly(net).eval()
+    if quantize:
+        wrapped = torch.ao.quantization.quantize_dynamic(wrapped, {torch.nn.Linear}, dtype=torch.qint8)
+
+    with torch.inference_mode():
+        traced = torch.jit.trace(wrapped, torch.zeros(1, 3, imgsz, imgsz), check_trace=False)
+    traced = torch.jit.freeze(traced.eval())
+
+    meta = json.dumps({'imgsz': imgsz, 'names': {str(k): v for k, v in yolo.names.items()}})
+    # several inference workers may export at once on a cold cache; each writes its own file
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(artifact_path)), prefix='.tmp-')
+    os.close(fd)
+    try:
+        torch.jit.save(traced, tmp_path, _extra_files={'meta.json': meta})
+        os.replace(tmp_path, artifact_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return artifact_path
+
+
+def load_backend(name, model_path, cache_dir=None, warmup=True):
+    """Construct the named backend and run its warmup passes."""
+    if name == 'eager':
+        backend = EagerBackend(model_path)
+    elif name in ('torchscript', 'torchscript-int8'):
+        backend = TorchScriptBackend(model_path, quantize=name.endswith('int8'), cache_dir=cache_dir)
+    else:
+        raise ValueError(f'Unknown inference backend {name!r}; expected one of {", ".join(BACKENDS)}')
+    if warmup:
+        backend.warmup()
+    return backend
+
+
+def _load_holdout(root):
+    """Read an ImageFolder-style directory: root/<class name>/<image>."""
+    samples = []
+    for label in sorted(os.listdir(root)):
+        class_dir = os.path.join(root, label)
+        if not os.path.isdir(class_dir):
+            continue
+        for fname in sorted(os.listdir(class_dir)):
+            if fname.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')):
+                samples.append((os.path.join(class_dir, fname), label))
+    return samples
+
+
+def evaluate(backends, model_path, holdout, batch_size=16, cache_dir=None):
+    """Accuracy, agreement with eager, latency and throughput for each backend."""
+    samples = _load_holdout(holdout)
+    if not samples:
+        raise SystemExit(f'No images found under {holdout}')
+    images = [Image.open(path).convert('RGB') for path, _ in samples]
+    labels = [label for _, label in samples]
+
+    report = {}
+    reference = None
+    for name in backends:
+        backend = load_backend(name, model_path, cache_dir=cache_dir)
+
+        latencies = []
+        for img in images:
+            t0 = time.perf_counter()
+            backend.predict_batch([img])
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+        predictions = []
+        t0 = time.perf_counter()
+        for i in range(0, len(images), batch_size):
+            predictions.extend(backend.predict_batch(images[i:i + batch_size]))
+        elapsed = time.perf_counter() - t0
+
+        classes = [cls for cls, _ in predictions]
+        if reference is None:
+            reference = classes
+        report[name] = {
+            'images': len(images),
+            'accuracy': round(sum(c == l for c, l in zip(classes, labels)) / len(labels), 4),
+            'agreement_with_' + backends[0]: round(sum(c == r for c, r in zip(classes, reference)) / len(labels), 4),
+            'latency_ms_p50': round(float(np.percentile(latencies, 50)), 2),
+            'latency_ms_p95': round(float(np.percentile(latencies, 95)), 2),
+            'throughput_ips': round(len(images) / elapsed, 1),
+            'batch_size': batch_size
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['export', 'evaluate'])
+    parser.add_argument('--model', default='best.pt')
+    parser.add_argument('--backend', default='torchscript-int8', choices=BACKENDS)
+    parser.add_argument('--backends', default=','.join(BACKENDS),
+                        help='comma-separated backends to evaluate; the first is the reference')
+    parser.add_argument('--holdout', help='held-out ImageFolder directory for evaluate')
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--cache-dir')
+    parser.add_argument('--threads', type=int, help='torch intra-op threads')
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    if args.command == 'export':
+        backend = load_backend(args.backend, args.model, cache_dir=args.cache_dir, warmup=False)
+        print(getattr(backend, 'artifact_path', 'eager backend has no artifact'))
+        return
+
+    if not args.holdout:
+        parser.error('evaluate requires --holdout')
+    report = evaluate(args.backends.split(','), args.model, args.holdout,
+                      batch_size=args.batch_size, cache_dir=args.cache_dir)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
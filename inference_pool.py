@@ -0,0 +1,236 @@
+import itertools
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+def parse_cpu_sets(spec, workers):
+    """Turn an affinity spec into one CPU set per worker.
+
+    'auto' splits the CPUs this process may run on evenly between workers;
+    otherwise spec is a ';'-separated list of comma/range lists, e.g.
+    '0-7;8-15'. An empty spec means no pinning.
+    """
+    if not spec or not hasattr(os, 'sched_getaffinity'):
+        return [None] * workers
+
+    if spec == 'auto':
+        cpus = sorted(os.sched_getaffinity(0))
+        per_worker = max(1, len(cpus) // workers)
+        starts = [(i * per_worker) % len(cpus) for i in range(workers)]
+        return [set(cpus[start:start + per_worker]) for start in starts]
+
+    sets = []
+    for group in spec.split(';'):
+        cpus = set()
+        for part in group.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if '-' in part:
+                lo, hi = part.split('-')
+                cpus.update(range(int(lo), int(hi) + 1))
+            else:
+                cpus.add(int(part))
+        sets.append(cpus or None)
+    return [sets[i % len(sets)] for i in range(workers)]
+
+
+def _attach_image(name, shape):
+    """Copy an image out of a shared memory segment into process-local memory."""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.array(np.ndarray(shape, dtype=np.uint8, buffer=shm.buf))
+    finally:
+        shm.close()
+
+
+def _worker_main(model_path, backend, cache_dir, torch_threads, cpu_set, tasks, results):
+    if cpu_set and hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpu_set)
+
+    import torch
+    torch.set_num_threads(torch_threads)
+
+    from inference_backends import load_backend
+
+    try:
+        model = load_backend(backend, model_path, cache_dir=cache_dir)
+    except Exception as e:
+        results.put(('failed', os.getpid(), f'{type(e).__name__}: {e}'))
+        return
+    results.put(('ready', os.getpid(), None))
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        task_id, specs = task
+        try:
+            images = [_attach_image(name, shape) for name, shape in specs]
+            results.put((task_id, model.predict_batch(images), None))
+        except Exception as e:
+            results.put((task_id, None, f'{type(e).__name__}: {e}'))
+
+
+class InferencePool:
+    """A pool of worker processes that each hold their own copy of the model.
+
+    Images are handed over as uint8 BGR arrays in shared memory segments;
+    only segment names and shapes go through the task queues. Each worker
+    has its own queue, so the pool knows which batches a worker holds: when
+    a worker dies, a watchdog fails those batches at once and starts a
+    replacement.
+    """
+
+    def __init__(self, model_path, backend='eager', cache_dir=None, workers=2, torch_threads=1,
+                 cpu_affinity=None, start_method='fork', watch_interval=1.0):
+        self.model_path = model_path
+        self.backend = backend
+        self.cache_dir = cache_dir
+        self.workers = max(1, int(workers))
+        self.torch_threads = max(1, int(torch_threads))
+        self.cpu_sets = parse_cpu_sets(cpu_affinity, self.workers)
+        self.watch_interval = watch_interval
+        self._ctx = mp.get_context(start_method)
+        self._results = self._ctx.Queue()
+        self._pending = {}
+        self._pending_lock = threading.Lock()
+        self._ids = itertools.count()
+        self._processes = [None] * self.workers
+        self._queues = [None] * self.workers
+        # task ids handed to each worker and not yet answered
+        self._in_flight = [set() for _ in range(self.workers)]
+        self._assigned = {}
+        self._ready_pids = set()
+        self._closing = False
+        self.restarts = 0
+        self.load_error = None
+        self._loaded = threading.Event()
+
+    def _spawn(self, i):
+        tasks = self._ctx.Queue()
+        p = self._ctx.Process(
+            target=_worker_main,
+            args=(self.model_path, self.backend, self.cache_dir, self.torch_threads,
+                  self.cpu_sets[i], tasks, self._results),
+            name=f'inference-worker-{i}',
+            daemon=True
+        )
+        p.start()
+        self._queues[i] = tasks
+        self._processes[i] = p
+
+    def start(self):
+        for i in range(self.workers):
+            self._spawn(i)
+        threading.Thread(target=self._collect_results, name='inference-results', daemon=True).start()
+        threading.Thread(target=self._watch_workers, name='inference-watchdog', daemon=True).start()
+
+    @property
+    def ready_workers(self):
+        return sum(1 for p in self._processes if p is not None and p.pid in self._ready_pids and p.is_alive())
+
+    def _collect_results(self):
+        while True:
+            task_id, payload, error = self._results.get()
+            if task_id == 'ready':
+                self._ready_pids.add(payload)
+                if len(self._ready_pids) >= self.workers:
+                    self._loaded.set()
+                continue
+            if task_id == 'failed':
+                self.load_error = error
+                self._loaded.set()
+                continue
+            with self._pending_lock:
+                fut = self._pending.pop(task_id, None)
+                worker = self._assigned.pop(task_id, None)
+                if worker is not None:
+                    self._in_flight[worker].discard(task_id)
+            if fut is None:
+                continue
+            if error:
+                fut.set_exception(RuntimeError(error))
+            else:
+                fut.set_result(payload)
+
+    def _watch_workers(self):
+        while not self._closing:
+            time.sleep(self.watch_interval)
+            for i, p in enumerate(self._processes):
+                if self._closing or p.is_alive():
+                    continue
+                with self._pending_lock:
+                    lost = [(task_id, self._pending.pop(task_id, None)) for task_id in self._in_flight[i]]
+                    for task_id, _ in lost:
+                        self._assigned.pop(task_id, None)
+                    self._in_flight[i] = set()
+                error = RuntimeError(f'Inference worker {i} (pid {p.pid}) exited with code {p.exitcode}')
+                for _, fut in lost:
+                    if fut is not None:
+                        fut.set_exception(error)
+                self._ready_pids.discard(p.pid)
+                # a model that failed to load would fail again in a replacement
+                if self.load_error is None:
+                    self._spawn(i)
+                    self.restarts += 1
+
+    def predict_batch(self, images, timeout=120):
+        """Classify a list of PIL images on a worker; returns (class, confidence) per image."""
+        segments = []
+        try:
+            specs = []
+            for img in images:
+                arr = np.asarray(img.convert('RGB'))[:, :, ::-1]
+                shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+                segments.append(shm)
+                np.ndarray(arr.shape, dtype=np.uint8, buffer=shm.buf)[:] = arr
+                specs.append((shm.name, arr.shape))
+
+            task_id = next(self._ids)
+            fut = Future()
+            with self._pending_lock:
+                # the least busy live worker; a dead one keeps its slot until the watchdog replaces it
+                alive = [i for i, p in enumerate(self._processes) if p.is_alive()] or range(self.workers)
+                worker = min(alive, key=lambda i: len(self._in_flight[i]))
+                self._pending[task_id] = fut
+                self._assigned[task_id] = worker
+                self._in_flight[worker].add(task_id)
+                self._queues[worker].put((task_id, specs))
+            try:
+                return fut.result(timeout=timeout)
+            finally:
+                with self._pending_lock:
+                    self._pending.pop(task_id, None)
+                    if self._assigned.pop(task_id, None) == worker:
+                        self._in_flight[worker].discard(task_id)
+        finally:
+            for shm in segments:
+                shm.close()
+                shm.unlink()
+
+    def wait_ready(self, timeout=None):
+        """Block until every worker has loaded and warmed up its model; returns the pool."""
+        if not self._loaded.wait(timeout):
+            raise TimeoutError('Inference workers did not become ready in time')
+        if self.load_error:
+            raise RuntimeError(self.load_error)
+        return self
+
+    def alive_workers(self):
+        return sum(1 for p in self._processes if p is not None and p.is_alive())
+
+    def close(self, timeout=5):
+        self._closing = True
+        for tasks in self._queues:
+            tasks.put(None)
+        for p in self._processes:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
@@ -0,0 +1,127 @@
+import queue
+import threading
+import time
+import uuid
+
+
+class JobQueue:
+    """Runs submitted callables on background threads and tracks their status.
+
+    Finished jobs are kept for retention_seconds so clients can poll for the
+    result; wait() lets a caller block until a job finishes (long-poll).
+    """
+
+    def __init__(self, workers=4, retention_seconds=3600):
+        self.workers = max(1, int(workers))
+        self.retention = float(retention_seconds)
+        self._queue = queue.Queue()
+        self._jobs = {}
+        self._cond = threading.Condition()
+        self._threads = []
+        self._running = 0
+        self._completed = 0
+        self._failed = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._work_loop, name=f'job-worker-{i}', daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) and return the new job id."""
+        self._ensure_started()
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'status': 'queued',
+            'result': None,
+            'error': None,
+            'submitted_at': time.time(),
+            'started_at': None,
+            'finished_at': None
+        }
+        with self._cond:
+            self._prune()
+            self._jobs[job_id] = job
+        self._queue.put((job_id, fn, args, kwargs))
+        return job_id
+
+    def _snapshot(self, job):
+        snap = dict(job)
+        if job['started_at']:
+            snap['queue_ms'] = round((job['started_at'] - job['submitted_at']) * 1000, 1)
+        if job['finished_at']:
+            snap['run_ms'] = round((job['finished_at'] - job['started_at']) * 1000, 1)
+        return snap
+
+    def get(self, job_id):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            return self._snapshot(job) if job else None
+
+    def wait(self, job_id, timeout):
+        """Block up to timeout seconds for a job to finish; returns its snapshot."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                job = self._jobs.get(job_id)
+                if job is None:
+                    return None
+                remaining = deadline - time.monotonic()
+                if job['status'] in ('done', 'failed') or remaining <= 0:
+                    return self._snapshot(job)
+                self._cond.wait(remaining)
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        expired = [jid for jid, job in self._jobs.items()
+                   if job['finished_at'] and job['finished_at'] < cutoff]
+        for jid in expired:
+            del self._jobs[jid]
+
+    def _work_loop(self):
+        while True:
+            job_id, fn, args, kwargs = self._queue.get()
+            with self._cond:
+                job = self._jobs[job_id]
+                job['status'] = 'running'
+                job['started_at'] = time.time()
+                self._running += 1
+            try:
+                result, error = fn(*args, **kwargs), None
+            except Exception as e:
+                result, error = None, str(e)
+            with self._cond:
+                job['finished_at'] = time.time()
+                job['status'] = 'failed' if error else 'done'
+                job['result'] = result
+                job['error'] = error
+                self._running -= 1
+                if error:
+                    self._failed += 1
+                else:
+                    self._completed += 1
+                self._total_wait += job['started_at'] - job['submitted_at']
+                self._total_run += job['finished_at'] - job['started_at']
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            finished = self._completed + self._failed
+            return {
+                'queued': self._queue.qsize(),
+                'running': self._running,
+                'completed': self._completed,
+                'failed': self._failed,
+                'workers': self.workers,
+                'avg_queue_ms': round(self._total_wait / finished * 1000, 1) if finished else None,
+                'avg_run_ms': round(self._total_run / finished * 1000, 1) if finished else None
+            }
@@ -0,0 +1,69 @@
+import threading
+import time
+
+
+class ResourceNotReady(Exception):
+    pass
+
+
+class BackgroundLoader:
+    """Builds an expensive resource (model, detector) off the request path.
+
+    mode 'background' starts loading on a daemon thread as soon as start()
+    is called, 'lazy' loads on first get(), and 'eager' loads inside start().
+    status() reports progress for the readiness probe.
+    """
+
+    def __init__(self, name, factory, mode='background'):
+        self.name = name
+        self.factory = factory
+        self.mode = mode
+        self.state = 'pending'
+        self.error = None
+        self.load_seconds = None
+        self._resource = None
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    def start(self):
+        if self.mode == 'eager':
+            self._load()
+        elif self.mode == 'background':
+            threading.Thread(target=self._load, name=f'load-{self.name}', daemon=True).start()
+        return self
+
+    def _load(self):
+        with self._lock:
+            if self.state in ('loading', 'ready'):
+                return
+            self.state = 'loading'
+        t0 = time.perf_counter()
+        try:
+            resource = self.factory()
+        except Exception as e:
+            self.error = str(e)
+            self.state = 'failed'
+            print(f"Error loading {self.name}: {e}")
+        else:
+            self._resource = resource
+            self.state = 'ready'
+            print(f"{self.name} loaded in {time.perf_counter() - t0:.1f}s")
+        self.load_seconds = round(time.perf_counter() - t0, 2)
+        self._done.set()
+
+    @property
+    def ready(self):
+        return self.state == 'ready'
+
+    def get(self, timeout=None):
+        """Return the resource, waiting up to timeout seconds for it to load."""
+        if self.state == 'pending' and self.mode == 'lazy':
+            self._load()
+        if not self._done.wait(timeout):
+            raise ResourceNotReady(f'{self.name} is still loading')
+        if self.state != 'ready':
+            raise ResourceNotReady(f'{self.name} failed to load: {self.error}')
+        return self._resource
+
+    def status(self):
+        return {'state': self.state, 'error': self.error, 'load_seconds': self.load_seconds}
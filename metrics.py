@@ -0,0 +1,273 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# seconds; covers a cached lookup (sub-millisecond) up to a slow CPU inference batch
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+
+    def render(self, shared=None):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        if shared is None:
+            with self._lock:
+                values = sorted(self._values.items())
+        else:
+            merged = {}
+            for _, series in shared:
+                for key, value in series:
+                    merged[tuple(key)] = merged.get(tuple(key), 0) + value
+            values = sorted(merged.items())
+        for key, value in values:
+            lines.append(f'{self.name}{_labels(self.label_names, key)} {_number(value)}')
+        return lines
+
+
+class Gauge:
+    """A value read at scrape time: fn() returns a number, or {label values tuple: number}."""
+
+    def __init__(self, name, help, fn, labels=()):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.label_names = tuple(labels)
+
+    def _read(self):
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        items = value.items() if isinstance(value, dict) else [((), value)]
+        return [(key, v) for key, v in items if v is not None]
+
+    def snapshot(self):
+        return [[list(key), value] for key, value in self._read()]
+
+    def render(self, shared=None):
+        """With shared (from several processes), each series gets a pid label instead of being summed."""
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        if shared is None:
+            names, items = self.label_names, self._read()
+        else:
+            names = self.label_names + ('pid',)
+            items = [(tuple(key) + (pid,), v) for pid, series in shared for key, v in series]
+        for key, v in sorted(items):
+            lines.append(f'{self.name}{_labels(names, key)} {_number(v)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), [list(counts), total, n]] for key, (counts, total, n) in self._series.items()]
+
+    def render(self, shared=None):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        if shared is None:
+            with self._lock:
+                series = sorted((key, (list(counts), total, n)) for key, (counts, total, n) in self._series.items())
+        else:
+            merged = {}
+            for _, snapshot in shared:
+                for key, (counts, total, n) in snapshot:
+                    entry = merged.setdefault(tuple(key), [[0] * len(counts), 0.0, 0])
+                    entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                    entry[1] += total
+                    entry[2] += n
+            series = sorted(merged.items())
+        for key, (counts, total, n) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = 'le="' + _number(bound) + '"'
+                lines.append(f'{self.name}_bucket{_labels(self.label_names, key, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.label_names, key)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.label_names, key)} {n}')
+        return lines
+
+
+class Registry:
+    """Metrics exported together in the Prometheus text format.
+
+    After share(directory), the process publishes its metrics there every
+    few seconds, and render() reports the merged metrics of every live
+    process sharing the directory. Counters and histograms are summed and
+    gauges get a pid label. This is how each gunicorn worker answers
+    /metrics for the whole server.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self.directory = None
+        self._publish_lock = threading.Lock()
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, fn, labels=()):
+        return self.register(Gauge(name, help, fn, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def share(self, directory, interval=5.0):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+        def publish_loop():
+            while True:
+                try:
+                    self._publish()
+                except OSError:
+                    pass
+                time.sleep(interval)
+
+        threading.Thread(target=publish_loop, name='metrics-publisher', daemon=True).start()
+
+    def _publish(self):
+        path = os.path.join(self.directory, f'{os.getpid()}.json')
+        state = {m.name: m.snapshot() for m in self._metrics}
+        with self._publish_lock:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(state, f)
+            os.replace(path + '.tmp', path)
+
+    def _collect(self):
+        self._publish()
+        shared = []
+        for name in os.listdir(self.directory):
+            stem, ext = os.path.splitext(name)
+            if ext != '.json' or not stem.isdigit():
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                os.kill(int(stem), 0)
+            except ProcessLookupError:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                continue
+            except PermissionError:
+                pass
+            try:
+                with open(path) as f:
+                    shared.append((int(stem), json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return shared
+
+    def render(self):
+        shared = self._collect() if self.directory else None
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(None if shared is None else [(pid, s.get(metric.name, [])) for pid, s in shared]))
+        return '\n'.join(lines) + '\n'
+
+
+class QueryTimer:
+    """Counts SQL statements and their time per thread, via SQLAlchemy engine events.
+
+    reset() at the start of a request and take() at its end give that
+    request's (query count, seconds); queries run on other threads (the
+    write coalescer, job workers) are not attributed to it.
+    """
+
+    def __init__(self, engine, histogram=None):
+        from sqlalchemy import event
+
+        self.histogram = histogram
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+
+    # the start time lives on the execution context: after_cursor_execute never fires for a
+    # statement that raised, and a value left on the connection would time the next query
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_query_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        local = self._local
+        local.count = getattr(local, 'count', 0) + 1
+        local.seconds = getattr(local, 'seconds', 0.0) + elapsed
+        if self.histogram is not None:
+            self.histogram.observe(elapsed, statement.split(None, 1)[0].upper() if statement else '')
+
+    def reset(self):
+        self._local.count = 0
+        self._local.seconds = 0.0
+
+    def take(self):
+        count, seconds = getattr(self._local, 'count', 0), getattr(self._local, 'seconds', 0.0)
+        self.reset()
+        return count, seconds
@@ -0,0 +1,142 @@
+"""Versioned schema migrations.
+
+db.create_all() creates any missing tables from the current models; the
+numbered migrations below then bring older databases up to date. Applied
+versions are recorded in the schema_version table, so each one runs once.
+To change the schema, update the model and append a new migration.
+"""
+import os
+from datetime import datetime
+
+from sqlalchemy import DateTime, MetaData, bindparam, inspect, text
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+
+def _add_missing_columns(conn, table, columns):
+    existing = {c['name'] for c in inspect(conn).get_columns(table)}
+    for name, ddl_type in columns:
+        if name not in existing:
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {name} {ddl_type}'))
+
+
+def _create_declared_indexes(db, tables):
+    # SQLite does not reflect expression indexes such as lower(email), so checkfirst
+    # cannot see the ones create_all() just made; let the database skip them instead
+    def apply(conn):
+        for name in tables:
+            for index in db.metadata.tables[name].indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+    return apply
+
+
+def _rebuild_sqlite_table(conn, table):
+    """Recreate table from its model definition, keeping its rows; SQLite cannot alter a column."""
+    rebuilt = table.to_metadata(MetaData(), name=f'{table.name}_rebuild')
+    conn.execute(CreateTable(rebuilt))
+    columns = ', '.join(c.name for c in table.columns)
+    conn.execute(text(f'INSERT INTO {rebuilt.name} ({columns}) SELECT {columns} FROM {table.name}'))
+    conn.execute(text(f'DROP TABLE {table.name}'))
+    conn.execute(text(f'ALTER TABLE {rebuilt.name} RENAME TO {table.name}'))
+
+
+def _legacy_columns(conn):
+    _add_missing_columns(conn, 'patient', [('password', 'VARCHAR(255)')])
+    _add_missing_columns(conn, 'typing_result', [
+        ('risk_score', 'INTEGER'),
+        ('backspace_count', 'INTEGER'),
+        ('pause_count', 'INTEGER'),
+        ('hesitation_count', 'INTEGER'),
+        ('avg_key_delay', 'INTEGER')
+    ])
+
+
+def _content_addressed_uploads(upload_store):
+    # legacy files stay in place until `flask prune-uploads` finds them unreferenced,
+    # so a rolled-back transaction never leaves scan rows pointing at nothing
+    def apply(conn):
+        paths = [row[0] for row in conn.execute(text('SELECT DISTINCT file_path FROM scan WHERE file_path IS NOT NULL'))]
+        for path in paths:
+            if upload_store.digest_of(path) or not os.path.isfile(path):
+                continue
+            conn.execute(text('UPDATE scan SET file_path = :new WHERE file_path = :old'),
+                         {'new': upload_store.import_file(path), 'old': path})
+    return apply
+
+
+def _patient_created_at_required(db):
+    # undated patients sorted after every dated one, as NULLs do in (created_at desc) order
+    def apply(conn):
+        conn.execute(text('UPDATE patient SET created_at = :t WHERE created_at IS NULL').bindparams(
+            bindparam('t', datetime(1970, 1, 1), type_=DateTime)))
+        column = next(c for c in inspect(conn).get_columns('patient') if c['name'] == 'created_at')
+        if column['nullable']:
+            if conn.dialect.name == 'sqlite':
+                _rebuild_sqlite_table(conn, db.metadata.tables['patient'])
+            else:
+                conn.execute(text('ALTER TABLE patient ALTER COLUMN created_at SET NOT NULL'))
+        _create_declared_indexes(db, ['patient'])(conn)
+    return apply
+
+
+def _seed_patient_summaries(rebuild_summaries):
+    # writes only keep patient_summary current incrementally, so it must start from the existing results
+    def apply(conn):
+        with Session(bind=conn) as session:
+            rebuild_summaries(session)
+    return apply
+
+
+def migrations(db, upload_store=None, rebuild_summaries=None):
+    """(version, description, apply(conn)) in the order they must run.
+
+    Migrations that move files need upload_store, and the one that fills
+    patient_summary needs rebuild_summaries(session); without them they stay
+    pending until a run that provides them.
+    """
+    steps = [
+        (1, 'patient.password and typing_result metric columns', _legacy_columns),
+        (2, 'lower(email) and (patient_id, created_at) indexes',
+         _create_declared_indexes(db, ['patient', 'admin', 'scan', 'blink_result', 'typing_result'])),
+    ]
+    if upload_store is not None:
+        steps.append((3, 'scan.file_path to content-addressed upload store', _content_addressed_uploads(upload_store)))
+    steps.append((4, 'patient.created_at NOT NULL and (created_at, id) index', _patient_created_at_required(db)))
+    if rebuild_summaries is not None:
+        steps.append((5, 'patient_summary rebuilt from existing results', _seed_patient_summaries(rebuild_summaries)))
+    return steps
+
+
+def run_migrations(db, upload_store=None, rebuild_summaries=None):
+    """Create missing tables and apply pending migrations; returns the versions applied."""
+    db.create_all()
+    with db.engine.begin() as conn:
+        conn.execute(text(
+            'CREATE TABLE IF NOT EXISTS schema_version ('
+            'version INTEGER PRIMARY KEY, description VARCHAR(200), applied_at VARCHAR(40))'
+        ))
+        applied = {row[0] for row in conn.execute(text('SELECT version FROM schema_version'))}
+
+    newly_applied = []
+    for version, description, apply in migrations(db, upload_store, rebuild_summaries):
+        if version in applied:
+            continue
+        with db.engine.begin() as conn:
+            apply(conn)
+            conn.execute(
+                text('INSERT INTO schema_version (version, description, applied_at) VALUES (:v, :d, :t)'),
+                {'v': version, 'd': description, 't': datetime.utcnow().isoformat()}
+            )
+        newly_applied.append(version)
+    return newly_applied
+
+
+def full_table_scans(conn, statement):
+    """Tables a statement reads with a full scan, according to SQLite's query planner."""
+    sql = str(statement.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+    scans = []
+    for row in conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}'):
+        detail = row[-1]
+        if detail.startswith('SCAN ') and 'INDEX' not in detail:
+            scans.append(detail)
+    return scans
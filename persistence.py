@@ -0,0 +1,150 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from sqlalchemy import event
+
+
+class WriteTimeout(Exception):
+    pass
+
+
+def configure_database(app):
+    """Fill in the database URI and engine options from the environment.
+
+    DATABASE_URL selects the database (SQLite by default; any SQLAlchemy URL
+    such as postgresql://... for a pooled server database). SQLite gets WAL
+    journaling, a busy timeout and tuned synchronous/cache pragmas; server
+    databases get a connection pool sized by DB_POOL_SIZE/DB_MAX_OVERFLOW.
+    """
+    url = os.environ.get('DATABASE_URL', 'sqlite:///app.db')
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLITE_JOURNAL_MODE'] = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    app.config['SQLITE_SYNCHRONOUS'] = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    app.config['SQLITE_BUSY_TIMEOUT_MS'] = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    app.config['SQLITE_CACHE_SIZE_KIB'] = int(os.environ.get('SQLITE_CACHE_SIZE_KIB', 64 * 1024))
+    app.config['WRITE_COALESCING'] = os.environ.get('WRITE_COALESCING', '1') == '1'
+    app.config['WRITE_BATCH_SIZE'] = int(os.environ.get('WRITE_BATCH_SIZE', 64))
+    app.config['WRITE_FLUSH_MS'] = float(os.environ.get('WRITE_FLUSH_MS', 20))
+
+    if url.startswith('sqlite'):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'connect_args': {'timeout': app.config['SQLITE_BUSY_TIMEOUT_MS'] / 1000.0}
+        }
+    else:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            'pool_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+            'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 20)),
+            'pool_pre_ping': True,
+            'pool_recycle': 1800
+        }
+
+
+def install_sqlite_pragmas(app, engine):
+    """Apply the configured pragmas to every new SQLite connection."""
+    if engine.dialect.name != 'sqlite':
+        return
+
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        cur.execute(f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}")
+        cur.execute(f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}")
+        cur.execute(f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}")
+        cur.execute(f"PRAGMA cache_size=-{app.config['SQLITE_CACHE_SIZE_KIB']}")
+        cur.execute('PRAGMA temp_store=MEMORY')
+        cur.close()
+
+
+class WriteCoalescer:
+    """Background writer that groups inserts into shared transactions.
+
+    submit(fn) queues fn(session), which adds rows to the session and returns
+    the row whose id the caller wants. The writer thread collects up to
+    max_batch callables or waits at most max_latency_ms after the first,
+    applies them all and commits once. If a batch fails, its callables are
+    retried one per transaction so a single bad row only fails its own caller.
+    """
+
+    def __init__(self, app, db, max_batch=64, max_latency_ms=20):
+        self.app = app
+        self.db = db
+        self.max_batch = max(1, int(max_batch))
+        self.max_latency = max(0, float(max_latency_ms)) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._pid = None
+        self.batches = 0
+        self.writes = 0
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(target=self._write_loop, name='db-writer', daemon=True).start()
+            self._pid = os.getpid()
+
+    def submit(self, fn):
+        self._ensure_started()
+        fut = Future()
+        self._queue.put((fn, fut))
+        return fut
+
+    def write(self, fn, timeout=30):
+        """Queue fn and wait for its transaction to commit; returns the new row id.
+
+        Raises WriteTimeout when the commit takes longer than timeout; the
+        write stays queued and may still commit afterwards.
+        """
+        try:
+            return self.submit(fn).result(timeout=timeout)
+        except FutureTimeout:
+            raise WriteTimeout(f'Write not committed within {timeout}s') from None
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _apply(self, batch):
+        session = self.db.session
+        rows = [fn(session) for fn, _ in batch]
+        session.flush()
+        ids = [row.id if row is not None else None for row in rows]
+        session.commit()
+        return ids
+
+    def _write_loop(self):
+        with self.app.app_context():
+            while True:
+                batch = self._collect()
+                try:
+                    ids = self._apply(batch)
+                except Exception:
+                    self.db.session.rollback()
+                    for fn, fut in batch:
+                        try:
+                            fut.set_result(self._apply([(fn, fut)])[0])
+                        except Exception as e:
+                            self.db.session.rollback()
+                            fut.set_exception(e)
+                else:
+                    for (_, fut), row_id in zip(batch, ids):
+                        fut.set_result(row_id)
+                finally:
+                    self.db.session.close()
+                self.batches += 1
+                self.writes += len(batch)
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def file_fingerprint(path, chunk_size=1024 * 1024):
+    """sha256 of a file's contents, used as the model version in cache keys."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class PredictionCache:
+    """Two-tier cache of scan predictions keyed by image hash + model version.
+
+    The first tier is an in-process LRU bounded by max_entries; the second is
+    a SQLite table that survives restarts and is shared between processes.
+    Entries older than ttl_seconds are treated as misses in both tiers, and
+    put() deletes them from the table at most every prune_interval seconds.
+    """
+
+    def __init__(self, db_path, max_entries=1024, ttl_seconds=7 * 24 * 3600, prune_interval=3600):
+        self.db_path = db_path
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = float(ttl_seconds)
+        self.prune_interval = float(prune_interval)
+        self._next_prune = time.monotonic() + self.prune_interval
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn().execute(
+            'CREATE TABLE IF NOT EXISTS prediction_cache ('
+            'key TEXT PRIMARY KEY, predicted_class TEXT, confidence REAL, '
+            'file_path TEXT, created_at REAL)'
+        )
+        self._conn().commit()
+
+    @staticmethod
+    def make_key(image_digest, model_version):
+        return hashlib.sha256(f'{model_version}:{image_digest}'.encode()).hexdigest()
+
+    def _conn(self):
+        # a connection inherited across fork() must not be used by the child
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=5)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _expired(self, created_at):
+        return self.ttl > 0 and time.time() - created_at > self.ttl
+
+    def _remember(self, key, entry):
+        if not self.max_entries:
+            return
+        with self._lock:
+            self._lru[key] = entry
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.max_entries:
+                self._lru.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, key):
+        """Return {'class', 'confidence', 'file_path'} for a cached scan, or None."""
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                if self._expired(entry['created_at']):
+                    del self._lru[key]
+                    self.evictions += 1
+                else:
+                    self._lru.move_to_end(key)
+                    self.hits_memory += 1
+                    return entry
+
+        row = self._conn().execute(
+            'SELECT predicted_class, confidence, file_path, created_at FROM prediction_cache WHERE key = ?',
+            (key,)
+        ).fetchone()
+        if row is None or self._expired(row[3]):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        entry = {'class': row[0], 'confidence': row[1], 'file_path': row[2], 'created_at': row[3]}
+        self._remember(key, entry)
+        with self._lock:
+            self.hits_disk += 1
+        return entry
+
+    def put(self, key, predicted_class, confidence, file_path):
+        entry = {
+            'class': predicted_class,
+            'confidence': confidence,
+            'file_path': file_path,
+            'created_at': time.time()
+        }
+        conn = self._conn()
+        conn.execute(
+            'INSERT OR REPLACE INTO prediction_cache (key, predicted_class, confidence, file_path, created_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (key, predicted_class, confidence, file_path, entry['created_at'])
+        )
+        conn.commit()
+        self._remember(key, entry)
+        if time.monotonic() >= self._next_prune:
+            self._next_prune = time.monotonic() + self.prune_interval
+            self.prune()
+
+    def prune(self, dry_run=False):
+        """Drop expired rows from the persistent tier; returns how many were (or would be) removed."""
+        if self.ttl <= 0:
+            return 0
+        conn = self._conn()
+        cutoff = time.time() - self.ttl
+        if dry_run:
+            return conn.execute('SELECT COUNT(*) FROM prediction_cache WHERE created_at < ?', (cutoff,)).fetchone()[0]
+        cur = conn.execute('DELETE FROM prediction_cache WHERE created_at < ?', (cutoff,))
+        conn.commit()
+        return cur.rowcount
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits_memory + self.hits_disk + self.misses
+            return {
+                'hits_memory': self.hits_memory,
+                'hits_disk': self.hits_disk,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round((self.hits_memory + self.hits_disk) / lookups, 4) if lookups else None,
+                'memory_entries': len(self._lru),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl
+            }
@@ -0,0 +1,111 @@
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+
+class PatientResponseCache:
+    """Serialized per-patient responses with strong ETags, dropped on writes.
+
+    Every patient maps to a generation counter that invalidate() bumps. A
+    body is only stored if the generation it was built under is still
+    current, so a response read from the database just before a write can
+    never be cached after it. generations may be any mutable integer
+    sequence, e.g. a multiprocessing.Array shared by forked workers, in which
+    case an invalidation in one worker is seen by all of them.
+
+    Processes that share no memory (a CLI command and the server) share
+    stamp_path instead: invalidate_all() rewrites it, and every cache using
+    the same path drops all its entries within stamp_interval seconds.
+    """
+
+    def __init__(self, max_entries=2048, generations=None, buckets=4096, stamp_path=None, stamp_interval=1.0):
+        self.max_entries = max(0, int(max_entries))
+        self._generations = generations if generations is not None else [0] * buckets
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stamp_path = stamp_path
+        self.stamp_interval = stamp_interval
+        self._stamp = self._read_stamp()
+        self._stamp_checked = time.monotonic()
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _bucket(self, patient_id):
+        return patient_id % len(self._generations)
+
+    def _read_stamp(self):
+        if self.stamp_path is None:
+            return None
+        try:
+            with open(self.stamp_path) as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _check_stamp(self):
+        now = time.monotonic()
+        if self.stamp_path is None or now - self._stamp_checked < self.stamp_interval:
+            return
+        self._stamp_checked = now
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            with self._lock:
+                self._stamp = stamp
+                self._epoch += 1
+                self._entries.clear()
+
+    def generation(self, patient_id):
+        self._check_stamp()
+        return self._epoch, self._generations[self._bucket(patient_id)]
+
+    def get(self, patient_id):
+        """Return (etag, body) if a current response is cached, else None."""
+        generation = self.generation(patient_id)
+        with self._lock:
+            entry = self._entries.get(patient_id)
+            if entry is None or entry[0] != generation:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(patient_id)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, patient_id, generation, body):
+        """Cache body if generation is still current; returns (etag, body)."""
+        etag = hashlib.sha256(body).hexdigest()[:32]
+        if self.max_entries and generation == self.generation(patient_id):
+            with self._lock:
+                self._entries[patient_id] = (generation, etag, body)
+                self._entries.move_to_end(patient_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return etag, body
+
+    def invalidate(self, patient_id):
+        bucket = self._bucket(patient_id)
+        get_lock = getattr(self._generations, 'get_lock', None)
+        with (get_lock() if get_lock else self._lock):
+            self._generations[bucket] += 1
+        with self._lock:
+            self._entries.pop(patient_id, None)
+
+    def invalidate_all(self):
+        """Drop every cached response here and in every process sharing stamp_path."""
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            if self.stamp_path is not None:
+                stamp = uuid.uuid4().hex
+                os.makedirs(os.path.dirname(self.stamp_path) or '.', exist_ok=True)
+                with open(self.stamp_path + '.tmp', 'w') as f:
+                    f.write(stamp)
+                os.replace(self.stamp_path + '.tmp', self.stamp_path)
+                self._stamp = stamp
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
@@ -0,0 +1,46 @@
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class SamplingProfiler:
+    """Samples the Python stacks of every thread at a fixed interval.
+
+    The result is in the folded format ("thread;outer;...;inner count" per
+    line) read by flamegraph.pl, speedscope and inferno. Only one profile
+    runs at a time; profile() returns None while another is in progress.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stack(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f'{code.co_name} ({code.co_filename}:{frame.f_lineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def profile(self, seconds, interval=0.005):
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            me = threading.get_ident()
+            counts = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident != me:
+                        counts[f'{names.get(ident, ident)};{self._stack(frame)}'] += 1
+                time.sleep(interval)
+            return ''.join(f'{stack} {n}\n' for stack, n in counts.most_common())
+        finally:
+            self._lock.release()
+
+    @property
+    def running(self):
+        return self._lock.locked()
@@ -0,0 +1,53 @@
+"""Expired predictions must leave the persistent tier, not only be skipped on lookup."""
+import os
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def make_cache(tmp_path, monkeypatch):
+    monkeypatch.syspath_prepend(ROOT)
+    from prediction_cache import PredictionCache
+
+    return lambda **options: PredictionCache(str(tmp_path / 'cache.db'), **options)
+
+
+def _age(cache, key, seconds):
+    conn = cache._conn()
+    conn.execute('UPDATE prediction_cache SET created_at = created_at - ? WHERE key = ?', (seconds, key))
+    conn.commit()
+
+
+def _rows(cache):
+    return [row[0] for row in cache._conn().execute('SELECT key FROM prediction_cache ORDER BY key')]
+
+
+def test_prune_removes_only_expired_rows(make_cache):
+    cache = make_cache(ttl_seconds=60)
+    cache.put('old', 'AD', 0.9, 'a.png')
+    cache.put('new', 'CN', 0.8, 'b.png')
+    _age(cache, 'old', 120)
+
+    assert cache.prune(dry_run=True) == 1
+    assert _rows(cache) == ['new', 'old']
+    assert cache.prune() == 1
+    assert _rows(cache) == ['new']
+
+
+def test_put_prunes_periodically(make_cache):
+    cache = make_cache(ttl_seconds=60, prune_interval=0)
+    cache.put('old', 'AD', 0.9, 'a.png')
+    _age(cache, 'old', 120)
+    cache.put('new', 'CN', 0.8, 'b.png')
+    assert _rows(cache) == ['new']
+
+
+def test_no_ttl_keeps_everything(make_cache):
+    cache = make_cache(ttl_seconds=0, prune_interval=0)
+    cache.put('old', 'AD', 0.9, 'a.png')
+    _age(cache, 'old', 10 ** 9)
+    cache.put('new', 'CN', 0.8, 'b.png')
+    assert cache.prune() == 0
+    assert _rows(cache) == ['new', 'old']
@@ -0,0 +1,40 @@
+"""The hot-path queries must be served by indexes on a freshly migrated database."""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def web(tmp_path_factory):
+    workdir = tmp_path_factory.mktemp('app')
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('DATABASE_URL', f"sqlite:///{workdir / 'app.db'}")
+        mp.setenv('INSTANCE_PATH', str(workdir / 'instance'))
+        mp.setenv('MODEL_LOADING', 'lazy')
+        mp.syspath_prepend(ROOT)
+        mp.delitem(sys.modules, 'app', raising=False)
+        cwd = os.getcwd()
+        # uploads/ is relative to the working directory
+        os.chdir(workdir)
+        try:
+            import app
+        finally:
+            os.chdir(cwd)
+        yield app
+    sys.modules.pop('app', None)
+
+
+def test_migrations_apply_to_an_empty_database(web):
+    with web.app.app_context():
+        applied = web.run_migrations(web.db, rebuild_summaries=web.rebuild_patient_summaries)
+        assert applied == [1, 2, 4, 5]
+        assert web.run_migrations(web.db, rebuild_summaries=web.rebuild_patient_summaries) == []
+
+
+def test_hot_path_queries_use_indexes(web):
+    with web.app.app_context():
+        web.run_migrations(web.db)
+        assert web.check_query_plans() == {}
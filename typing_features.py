@@ -0,0 +1,141 @@
+"""Keystroke-stream storage and typing-test feature extraction.
+
+typing_test.html uploads the raw timing stream as two integer arrays:
+dt, the milliseconds since the previous event (the first is measured from
+the start of the test), and kind, one of KIND_* per event. A KIND_RESUME
+event marks the tab becoming visible again; as in the browser, the next
+key delay is measured from it rather than across the hidden time.
+
+features() derives the metrics the browser used to compute for any number
+of sessions at once, and risk_scores() applies the risk formula to them.
+Bump RISK_FORMULA_VERSION whenever the formula changes so stored sessions
+can be re-scored.
+"""
+import struct
+import zlib
+
+import numpy as np
+
+KIND_CHAR, KIND_BACKSPACE, KIND_OTHER, KIND_RESUME = 0, 1, 2, 3
+PAUSE_MS = 2000
+HESITATION_MS = 800
+RISK_FORMULA_VERSION = 1
+MAX_EVENTS = 100000
+
+MAGIC = b'KEY1'
+HEADER = struct.Struct('<4sII')
+
+
+def parse_upload(payload):
+    """Validate an uploaded {'dt': [...], 'kind': [...], 'total_ms': n}; returns (dt, kinds, total_ms)."""
+    try:
+        dt = np.asarray(payload['dt'], dtype=np.int64)
+        kinds = np.asarray(payload['kind'], dtype=np.int64)
+        total_ms = int(payload['total_ms'])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError('keystrokes must have integer arrays dt and kind, and total_ms')
+    if dt.ndim != 1 or dt.shape != kinds.shape or len(dt) > MAX_EVENTS:
+        raise ValueError(f'dt and kind must be flat arrays of equal length (at most {MAX_EVENTS})')
+    if (dt < 0).any() or total_ms < 0 or ((kinds < KIND_CHAR) | (kinds > KIND_RESUME)).any():
+        raise ValueError('keystrokes contain negative times or unknown event kinds')
+    return dt, kinds.astype(np.uint8), total_ms
+
+
+def encode(dt, kinds, total_ms):
+    """Pack a stream as header + zlib(int32 deltas, uint8 kinds)."""
+    payload = np.asarray(dt, dtype='<i4').tobytes() + np.asarray(kinds, dtype=np.uint8).tobytes()
+    return HEADER.pack(MAGIC, len(dt), total_ms) + zlib.compress(payload, 9)
+
+
+def decode(blob):
+    magic, n, total_ms = HEADER.unpack_from(blob)
+    if magic != MAGIC:
+        raise ValueError('Not a keystroke stream')
+    raw = zlib.decompress(blob[HEADER.size:])
+    if len(raw) != 5 * n:
+        raise ValueError('Corrupt keystroke stream')
+    dt = np.frombuffer(raw, dtype='<i4', count=n).astype(np.int64)
+    kinds = np.frombuffer(raw, dtype=np.uint8, offset=4 * n)
+    return dt, kinds, total_ms
+
+
+def round_half_up(values):
+    # Math.round semantics, so server and browser agree on .5 cases
+    return np.floor(np.asarray(values, dtype=np.float64) + 0.5).astype(np.int64)
+
+
+def text_stats(typed, passage):
+    """(words, correct characters, typed characters) for the final typed text."""
+    typed = typed[:len(passage)]
+    a = np.frombuffer(typed.encode('utf-32-le'), dtype=np.uint32)
+    b = np.frombuffer(passage[:len(typed)].encode('utf-32-le'), dtype=np.uint32)
+    return len(typed.split()), int((a == b).sum()), len(typed)
+
+
+def features(streams, texts):
+    """Typing metrics for many sessions at once.
+
+    streams is a list of (dt, kinds, total_ms); texts a matching list of
+    (words, correct, typed) from text_stats(). Returns a dict of arrays,
+    one entry per session.
+    """
+    n = len(streams)
+    lengths = np.array([len(dt) for dt, _, _ in streams], dtype=np.int64)
+    owner = np.repeat(np.arange(n), lengths)
+    dt = np.concatenate([s[0] for s in streams]) if n else np.zeros(0, np.int64)
+    kinds = np.concatenate([s[1] for s in streams]) if n else np.zeros(0, np.uint8)
+    total_ms = np.array([s[2] for s in streams], dtype=np.float64)
+
+    # a key delay is the gap to the previous event in the same session; the first event has none
+    first = np.zeros(len(dt), dtype=bool)
+    first[np.concatenate([[0], np.cumsum(lengths)[:-1]])[lengths > 0]] = True
+    is_key = kinds != KIND_RESUME
+    timed = is_key & ~first
+    delays = np.where(timed, dt, 0)
+
+    key_count = np.bincount(owner, weights=timed, minlength=n)
+    total_delay = np.bincount(owner, weights=delays, minlength=n)
+    pauses = np.bincount(owner, weights=timed & (delays > PAUSE_MS), minlength=n)
+    hesitations = np.bincount(owner, weights=timed & (delays > HESITATION_MS) & (delays <= PAUSE_MS), minlength=n)
+    backspaces = np.bincount(owner, weights=kinds == KIND_BACKSPACE, minlength=n)
+
+    texts = np.array(texts, dtype=np.float64).reshape(n, 3)
+    words, correct, typed = texts[:, 0], texts[:, 1], texts[:, 2]
+    minutes = total_ms / 60000
+    with np.errstate(divide='ignore', invalid='ignore'):
+        wpm = np.where(minutes > 0.01, round_half_up(words / np.where(minutes > 0, minutes, 1)), 0)
+        accuracy = np.where(typed > 0, round_half_up(correct / np.where(typed > 0, typed, 1) * 100), 100)
+        avg_delay = np.where(key_count > 0, total_delay / np.maximum(key_count, 1), 0.0)
+        backspace_rate = np.where(key_count > 0, backspaces / np.maximum(key_count, 1), 0.0)
+
+    return {
+        'wpm': wpm.astype(np.int64),
+        'accuracy': accuracy.astype(np.int64),
+        'avg_key_delay': avg_delay,
+        'backspace_rate': backspace_rate,
+        'backspace_count': backspaces.astype(np.int64),
+        'pause_count': pauses.astype(np.int64),
+        'hesitation_count': hesitations.astype(np.int64),
+        'key_count': key_count.astype(np.int64)
+    }
+
+
+def risk_scores(f):
+    """The typing risk formula (0-100) over arrays from features()."""
+    wpm, accuracy, avg_delay, rate = f['wpm'], f['accuracy'], f['avg_key_delay'], f['backspace_rate']
+    score = np.select([wpm < 20, wpm < 35, wpm < 50], [30, 20, 10], 0)
+    score += np.select([accuracy < 70, accuracy < 85, accuracy < 95], [25, 15, 5], 0)
+    score += np.select([avg_delay > 800, avg_delay > 500, avg_delay > 300], [20, 12, 5], 0)
+    score += np.select([rate > 0.3, rate > 0.15], [15, 8], 0)
+    score += np.minimum(f['pause_count'] * 5, 20)
+    score += np.minimum(f['hesitation_count'] * 2, 10)
+    return np.minimum(score, 100)
+
+
+def score_session(dt, kinds, total_ms, typed, passage):
+    """Metrics and risk score for a single session, as plain Python values."""
+    f = features([(dt, kinds, total_ms)], [text_stats(typed, passage)])
+    result = {name: values[0].item() for name, values in f.items()}
+    result['avg_key_delay'] = int(round_half_up(result['avg_key_delay']))
+    result['risk_score'] = int(risk_scores(f)[0])
+    return result
@@ -0,0 +1,249 @@
+"""Content-addressed storage for uploaded scans.
+
+A scan is stored once, named by the sha256 of its bytes and sharded by the
+first two byte pairs of the digest: <root>/ab/cd/abcd....png. Identical
+uploads share a file, and no directory grows past a few hundred entries.
+Every write goes to a temporary file in the target directory and is then
+renamed into place, so readers never see a partial file.
+
+JPEG thumbnails are derived on first request and kept under <root>/thumbs
+with the same layout. Upload staging files live in <root>/tmp.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import time
+import uuid
+
+from PIL import Image
+
+DIGEST = re.compile(r'^[0-9a-f]{64}$')
+SIGNATURES = (
+    (b'\x89PNG', '.png'), (b'\xff\xd8\xff', '.jpg'), (b'GIF8', '.gif'), (b'BM', '.bmp'),
+    (b'II*\x00', '.tif'), (b'MM\x00*', '.tif')
+)
+
+
+def sniff_extension(head):
+    for signature, ext in SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    return '.bin'
+
+
+class UploadStore:
+    def __init__(self, root, thumbnail_size=256):
+        self.root = root
+        self.thumbnail_size = int(thumbnail_size)
+        self.thumbs_dir = os.path.join(root, 'thumbs')
+        self.tmp_dir = os.path.join(root, 'tmp')
+        self.deduplicated = 0
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def _shard(self, base, digest):
+        return os.path.join(base, digest[:2], digest[2:4])
+
+    def path_for(self, digest, ext):
+        return os.path.join(self._shard(self.root, digest), digest + ext)
+
+    def thumbnail_path(self, digest):
+        return os.path.join(self._shard(self.thumbs_dir, digest), digest + '.jpg')
+
+    def staging_path(self, suffix='.part'):
+        return os.path.join(self.tmp_dir, f'{uuid.uuid4().hex}{suffix}')
+
+    @staticmethod
+    def digest_of(path):
+        """The content digest of a path in this store's layout, else None (e.g. a legacy uuid name)."""
+        name = os.path.splitext(os.path.basename(path or ''))[0]
+        return name if DIGEST.match(name) else None
+
+    def find(self, digest):
+        """Path of the stored original for digest, or None."""
+        shard = self._shard(self.root, digest)
+        try:
+            names = os.listdir(shard)
+        except FileNotFoundError:
+            return None
+        for name in names:
+            if name.startswith(digest + '.'):
+                return os.path.join(shard, name)
+        return None
+
+    def _existing(self, path):
+        # a repeat upload refreshes the mtime so eviction's grace period restarts
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        self.deduplicated += 1
+        return True
+
+    def _atomic_write(self, path, write):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def put_bytes(self, digest, data):
+        """Store data under its digest; returns the stored path."""
+        path = self.path_for(digest, sniff_extension(data[:12]))
+        if not self._existing(path):
+            self._atomic_write(path, lambda f: f.write(data))
+        return path
+
+    def put_file(self, digest, source, move=True):
+        """Store a file under its digest, moving it (or copying when move=False); returns the stored path.
+
+        A moved source must be on the store's filesystem, e.g. a staging_path().
+        """
+        with open(source, 'rb') as f:
+            path = self.path_for(digest, sniff_extension(f.read(12)))
+        if self._existing(path):
+            if move:
+                os.remove(source)
+        elif move:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(source, path)
+        else:
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.link(source, path)
+                return path
+            except FileExistsError:
+                return path
+            except OSError:
+                pass
+
+            def copy(out):
+                with open(source, 'rb') as f:
+                    for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                        out.write(chunk)
+            self._atomic_write(path, copy)
+        return path
+
+    def import_file(self, source):
+        """Hard-link (or copy) an existing file into the store; returns the stored path."""
+        h = hashlib.sha256()
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+        return self.put_file(h.hexdigest(), source, move=False)
+
+    def thumbnail(self, digest):
+        """Path of the JPEG thumbnail for digest, creating it if needed; None if neither exists.
+
+        Raises what PIL raises for an original it cannot decode: OSError (UnidentifiedImageError for
+        unknown formats), ValueError or SyntaxError for some truncated files, DecompressionBombError.
+        """
+        thumb = self.thumbnail_path(digest)
+        if os.path.exists(thumb):
+            return thumb
+        original = self.find(digest)
+        if original is None:
+            return None
+        with Image.open(original) as img:
+            img.thumbnail((self.thumbnail_size, self.thumbnail_size))
+            img = img.convert('L' if img.mode in ('1', 'L', 'I', 'I;16', 'F') else 'RGB')
+            self._atomic_write(thumb, lambda f: img.save(f, 'JPEG', quality=80, optimize=True))
+        return thumb
+
+    def _walk(self, base, skip=()):
+        for directory, dirs, files in os.walk(base):
+            if directory == base:
+                dirs[:] = [d for d in dirs if d not in skip]
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, st
+
+    def originals(self):
+        """(path, stat) for every stored original."""
+        for path, st in self._walk(self.root, skip=('thumbs', 'tmp')):
+            if self.digest_of(path) and not os.path.basename(path).startswith('.'):
+                yield path, st
+
+    def evict(self, keep, known, grace_seconds=3600, dry_run=False):
+        """Apply the retention policy; returns counts of what was (or, with dry_run, would be) removed.
+
+        keep: stored paths that must stay; known: every path still
+        referenced by a record. Originals outside keep, flat-layout files
+        no record knows, and thumbnails of unknown digests are removed once
+        older than grace_seconds. Thumbnails of known records stay, so
+        history views keep a preview of scans whose original has expired.
+        Staging files older than a day are always removed.
+        """
+        keep = {os.path.normpath(p) for p in keep}
+        known = {os.path.normpath(p) for p in known}
+        known_digests = {self.digest_of(p) for p in known}
+        now = time.time()
+        cutoff = now - grace_seconds
+        result = {'originals': 0, 'legacy': 0, 'thumbnails': 0, 'staging': 0, 'bytes': 0}
+
+        def remove(path, st, kind):
+            result[kind] += 1
+            result['bytes'] += st.st_size
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+        for path, st in list(self.originals()):
+            if os.path.normpath(path) not in keep and st.st_mtime < cutoff:
+                remove(path, st, 'originals')
+
+        for entry in os.scandir(self.root):
+            if entry.is_file() and os.path.normpath(entry.path) not in known:
+                st = entry.stat()
+                if st.st_mtime < cutoff:
+                    remove(entry.path, st, 'legacy')
+
+        for path, st in list(self._walk(self.thumbs_dir)):
+            if self.digest_of(path) not in known_digests and st.st_mtime < cutoff:
+                remove(path, st, 'thumbnails')
+
+        for path, st in list(self._walk(self.tmp_dir)):
+            if st.st_mtime < now - 24 * 3600:
+                remove(path, st, 'staging')
+        return result
+
+    def trim_thumbnails(self, max_bytes, dry_run=False):
+        """Drop the least recently served thumbnails over max_bytes; only those that can be regenerated."""
+        thumbs = sorted(self._walk(self.thumbs_dir), key=lambda item: item[1].st_mtime)
+        total = sum(st.st_size for _, st in thumbs)
+        removed = {'thumbnails': 0, 'bytes': 0}
+        for path, st in thumbs:
+            if total <= max_bytes:
+                break
+            if self.find(self.digest_of(path)) is None:
+                continue
+            if not dry_run:
+                os.remove(path)
+            total -= st.st_size
+            removed['thumbnails'] += 1
+            removed['bytes'] += st.st_size
+        return removed
+
+    def usage(self):
+        originals = [st.st_size for _, st in self.originals()]
+        thumbs = [st.st_size for _, st in self._walk(self.thumbs_dir)]
+        return {
+            'originals': len(originals),
+            'original_bytes': sum(originals),
+            'thumbnails': len(thumbs),
+            'thumbnail_bytes': sum(thumbs)
+        }